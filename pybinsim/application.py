@@ -22,6 +22,7 @@
 
 """ Module contains main loop and configuration of pyBinSim """
 import logging
+import os
 import time
 import sys
 import numpy as np
@@ -87,10 +88,13 @@ class BinSimConfig(object):
                                   'useSplittedFilters': False,
                                   'lateReverbSize': 16384,
                                   'dirFilterSize': 16384,
+                                  'useHalfPrecisionFilters': False,
                                   'pauseConvolution': False,
                                   'pauseAudioPlayback': False,
                                   'serverIPAddress': '127.0.0.1',
-                                  'serverPort': '12346'}
+                                  'serverPort': '12346',
+                                  'cpuAffinity': -1,
+                                  'realtimePriority': 0}
 
     def read_from_file(self, filepath):
         config = open(filepath, 'r')
@@ -148,13 +152,19 @@ class BinSim(object):
         self.maxChannels = self.config.get('maxChannels')
         self.blockSize = self.config.get('blockSize')
 
+        # Settings used while processing blocks are read once here instead of on every block
+        self.enableCrossfading = self.config.get('enableCrossfading')
+        self.useSplittedFilters = self.config.get('useSplittedFilters')
+        self.loudnessFactor = float(self.config.get('loudnessFactor'))
+
         self.result = None
         self.block = None
+        self.receiveBuffer = None
         self.stream = None
 
         self.convolverWorkers = []
         #self.convolverHP, self.convolvers, self.filterStorage, self.oscReceiver, self.soundHandler = self.initialize_pybinsim()
-        self.convolverHP, self.convolvers, self.filterStorage = self.initialize_pybinsim()
+        self.convolvers, self.convolversHP, self.filterStorage = self.initialize_pybinsim()
         
         self.poseParser = InlinePoseParser(self.maxChannels)
         
@@ -175,94 +185,141 @@ class BinSim(object):
         self.zmq_context = zmq.Context()
         self.zmq_socket = self.zmq_context.socket(zmq.REP)
         self.zmq_socket.bind('tcp://' + self.zmq_ip + ':' + self.zmq_port)
+        self.zmq_poller = zmq.Poller()
+        self.zmq_poller.register(self.zmq_socket, zmq.POLLIN)
+        # milliseconds; only limits how long a poll blocks, requests wake it immediately
+        self.zmq_poll_timeout = 100
+
+    def set_realtime_scheduling(self):
+        """
+        Pin the processing thread to one CPU and switch it to SCHED_FIFO, if configured.
+        Both need Linux, SCHED_FIFO usually also root or CAP_SYS_NICE; failures are only logged
+
+        :return: None
+        """
+        cpu = self.config.get('cpuAffinity')
+        if cpu >= 0:
+            try:
+                os.sched_setaffinity(0, {cpu})
+                self.log.info('BinSim: pinned to CPU {}'.format(cpu))
+            except (AttributeError, OSError) as e:
+                self.log.warning('BinSim: cannot pin to CPU {}: {}'.format(cpu, e))
+
+        priority = self.config.get('realtimePriority')
+        if priority > 0:
+            try:
+                os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+                self.log.info('BinSim: SCHED_FIFO with priority {}'.format(priority))
+            except (AttributeError, OSError) as e:
+                self.log.warning('BinSim: cannot set SCHED_FIFO priority {}: {}'.format(priority, e))
 
     def run_server(self):
 
         self.log.info('BinSim: run_server')
-        
-        while True:
-            # wait for request from client
-            # TODO: avoid copying message
-            try:
 
-                message_frame = self.zmq_socket.recv(flags=zmq.NOBLOCK, copy=False)
-                
-                # non copying buffer view, but is read only...alternative for this?
-                in_buf = memoryview(message_frame)
-
-                stereo_audio_in = np.frombuffer(in_buf, dtype=np.float32).reshape((self.blockSize, self.inChannels))
-                # take first channel of input only as input for convolution
-                self.block[:] = stereo_audio_in[:,0]
-
-                # parse audio packet metadata from second input channel
-                convChannel          = int(stereo_audio_in[0, 1])
-                lst_to_src_azimuth   = stereo_audio_in[1, 1]
-                lst_to_src_elevation = stereo_audio_in[2, 1]
-                src_to_lst_azimuth   = stereo_audio_in[3, 1]
-                src_to_lst_elevation = stereo_audio_in[4, 1]
-                lst_to_src_dist      = stereo_audio_in[5, 1]
-
-                #self.log.info(f'lst->src azi: {lst_to_src_azimuth}')
-                #self.log.info(f'lst->src ele: {lst_to_src_elevation}')
-                #self.log.info(f'src->lst azi: {src_to_lst_azimuth}')
-                #self.log.info(f'src->lst ele: {src_to_lst_elevation}')
-                #self.log.info(f'distance: {lst_to_src_dist}')
-
-                # hrtf filters are reversed...
-                lst_to_src_azimuth = (360 - lst_to_src_azimuth) % 360
-
-                # elevation filters range from 0 to 180, not -90 to 90
-                lst_to_src_elevation += 90
-                src_to_lst_elevation += 90
-
-
-                # TODO: Change range perhaps...
-                reference_dist = 1.25
-                max_dist = 10
-                min_dist = 0.01
-                relative_dist = reference_dist / lst_to_src_dist
-                relative_dist = min(max(min_dist, relative_dist), max_dist)
-
-                # read rowmajor matrices from audio packet
-                src_transform = stereo_audio_in[6:22, 1] .reshape(4, 4)
-                lst_transform = stereo_audio_in[22:38, 1].reshape(4, 4)
-
-
-                # read mouth/ear angles
-                # ear_L_to_mouth_azimuth   = quantize_azimuth  (stereo_audio_in[39,1])
-                # ear_L_to_mouth_elevation = quantize_elevation(stereo_audio_in[40,1])
-                # ear_R_to_mouth_azimuth   = quantize_azimuth  (stereo_audio_in[41,1])
-                # ear_R_to_mouth_elevation = quantize_elevation(stereo_audio_in[42,1])
-                # mouth_to_ear_L_azimuth   = quantize_azimuth  (stereo_audio_in[43,1])
-                # mouth_to_ear_L_elevation = quantize_elevation(stereo_audio_in[44,1])
-                # mouth_to_ear_R_azimuth   = quantize_azimuth  (stereo_audio_in[45,1])
-                # mouth_to_ear_R_elevation = quantize_elevation(stereo_audio_in[46,1])
-                # ear_L_to_mouth_dist = stereo_audio_in[47,1]
-                # ear_R_to_mouth_dist = stereo_audio_in[48,1]
-
-                spatialization = stereo_audio_in[49,1]
-                if spatialization > 0.0:
-                    self.spatialize[convChannel] = True
-                else:
-                    self.spatialize[convChannel] = False
-                print("Channel " + str(convChannel) + " Spatialize: " + str(spatialization))
+        self.set_realtime_scheduling()
 
-                self.poseParser.parse_pose_input(convChannel, lst_to_src_azimuth, lst_to_src_elevation,
-                                                 src_to_lst_azimuth, src_to_lst_elevation)
+        while True:
+            # wait for requests from clients; the thread sleeps in poll instead of spinning
+            if not self.zmq_poller.poll(self.zmq_poll_timeout):
+                continue
+
+            # serve all requests which are already queued before polling again
+            while True:
+                try:
+                    # receive audio packet directly into the preallocated buffer;
+                    # self.block is a view on its first channel, which is the input for convolution
+                    message_size = self.zmq_socket.recv_into(self.receiveBuffer, flags=zmq.NOBLOCK)
+                except zmq.Again:
+                    break
+
+                self.handle_request(message_size)
+
+    def handle_request(self, message_size):
+        """
+        Process an audio packet in the receive buffer and send the result back to the client
+
+        :param message_size: size of the received packet in bytes
+        :return: None
+        """
+
+        if message_size != self.receiveBuffer.nbytes:
+            self.log.warning('Received packet of {} bytes, expected {}'.format(message_size,
+                                                                            self.receiveBuffer.nbytes))
+            self.result.fill(0)
+            self.zmq_socket.send(self.result, copy=False)
+            return
+
+        stereo_audio_in = self.receiveBuffer
+
+        # parse audio packet metadata from second input channel
+        convChannel          = int(stereo_audio_in[0, 1])
+        lst_to_src_azimuth   = stereo_audio_in[1, 1]
+        lst_to_src_elevation = stereo_audio_in[2, 1]
+        src_to_lst_azimuth   = stereo_audio_in[3, 1]
+        src_to_lst_elevation = stereo_audio_in[4, 1]
+        lst_to_src_dist      = stereo_audio_in[5, 1]
+
+        #self.log.info(f'lst->src azi: {lst_to_src_azimuth}')
+        #self.log.info(f'lst->src ele: {lst_to_src_elevation}')
+        #self.log.info(f'src->lst azi: {src_to_lst_azimuth}')
+        #self.log.info(f'src->lst ele: {src_to_lst_elevation}')
+        #self.log.info(f'distance: {lst_to_src_dist}')
+
+        # hrtf filters are reversed...
+        lst_to_src_azimuth = (360 - lst_to_src_azimuth) % 360
+
+        # elevation filters range from 0 to 180, not -90 to 90
+        lst_to_src_elevation += 90
+        src_to_lst_elevation += 90
+
+
+        # TODO: Change range perhaps...
+        reference_dist = 1.25
+        max_dist = 10
+        min_dist = 0.01
+        relative_dist = reference_dist / lst_to_src_dist
+        relative_dist = min(max(min_dist, relative_dist), max_dist)
+
+        # read rowmajor matrices from audio packet
+        src_transform = stereo_audio_in[6:22, 1] .reshape(4, 4)
+        lst_transform = stereo_audio_in[22:38, 1].reshape(4, 4)
+
+
+        # read mouth/ear angles
+        # ear_L_to_mouth_azimuth   = quantize_azimuth  (stereo_audio_in[39,1])
+        # ear_L_to_mouth_elevation = quantize_elevation(stereo_audio_in[40,1])
+        # ear_R_to_mouth_azimuth   = quantize_azimuth  (stereo_audio_in[41,1])
+        # ear_R_to_mouth_elevation = quantize_elevation(stereo_audio_in[42,1])
+        # mouth_to_ear_L_azimuth   = quantize_azimuth  (stereo_audio_in[43,1])
+        # mouth_to_ear_L_elevation = quantize_elevation(stereo_audio_in[44,1])
+        # mouth_to_ear_R_azimuth   = quantize_azimuth  (stereo_audio_in[45,1])
+        # mouth_to_ear_R_elevation = quantize_elevation(stereo_audio_in[46,1])
+        # ear_L_to_mouth_dist = stereo_audio_in[47,1]
+        # ear_R_to_mouth_dist = stereo_audio_in[48,1]
+
+        spatialization = stereo_audio_in[49,1]
+        if spatialization > 0.0:
+            self.spatialize[convChannel] = True
+        else:
+            self.spatialize[convChannel] = False
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug("Channel " + str(convChannel) + " Spatialize: " + str(spatialization))
 
-                self.process_block(convChannel, relative_dist)
+        self.poseParser.parse_pose_input(convChannel, lst_to_src_azimuth, lst_to_src_elevation,
+                                         src_to_lst_azimuth, src_to_lst_elevation)
 
-                #reply to client
-                self.zmq_socket.send(self.result, copy=False)
+        self.process_block(convChannel, relative_dist)
 
-            except zmq.ZMQError:
-                pass
+        #reply to client
+        self.zmq_socket.send(self.result, copy=False)
 
 
     def initialize_pybinsim(self):
         self.result = np.empty([self.blockSize, 2], dtype=np.float32)
         #self.block = np.empty([self.nChannels, self.blockSize], dtype=np.float32)
-        self.block = np.empty(self.blockSize, dtype=np.float32)
+        self.receiveBuffer = np.zeros([self.blockSize, self.inChannels], dtype=np.float32)
+        self.block = self.receiveBuffer[:, 0]
 
         # Create FilterStorage
         filterStorage = FilterStorage(self.config.get('filterSize'),
@@ -272,24 +329,29 @@ class BinSim(object):
                                       self.config.get('headphoneFilterSize'),
                                       self.config.get('useSplittedFilters'),
                                       self.config.get('lateReverbSize'),
-                                      self.config.get('dirFilterSize'))
+                                      self.config.get('dirFilterSize'),
+                                      self.config.get('useHalfPrecisionFilters'))
 
         # Create N convolvers depending on the number of wav channels
         self.log.info('Number of input channels: ' + str(self.inChannels))
         self.log.info('Number of channels to process: ' + str(self.maxChannels))
         convolvers = [None] * self.maxChannels
         for n in range(self.maxChannels):
-            convolvers[n] = ConvolverFFTW(self.config.get('filterSize'), self.blockSize, False, self.config.get('useSplittedFilters'), self.config.get('lateReverbSize'))
-
-        # HP Equalization convolver
-        convolverHP = None
-        if self.config.get('useHeadphoneFilter'):
-            convolverHP = ConvolverFFTW(self.config.get(
-                'headphoneFilterSize'), self.blockSize, True)
+            convolvers[n] = ConvolverFFTW(self.config.get('filterSize'), self.blockSize, False, self.config.get('useSplittedFilters'), self.config.get('lateReverbSize'),
+                                          filterExtension=filterStorage.headphone_extension)
+
+        # HP Equalization is merged into the filters by the FilterStorage, which makes them longer by headphone_extension.
+        # If that is not possible (directivity filters with more than one block), the output of every channel is
+        # equalized by a stereo convolver of its own, so the channels do not share the convolver state
+        convolversHP = None
+        if self.config.get('useHeadphoneFilter') and not filterStorage.mergeHeadphoneFilter:
             hpfilter = filterStorage.get_headphone_filter()
-            convolverHP.setIR(hpfilter, False)
+            convolversHP = [None] * self.maxChannels
+            for n in range(self.maxChannels):
+                convolversHP[n] = ConvolverFFTW(self.config.get('headphoneFilterSize'), self.blockSize, True)
+                convolversHP[n].setIR(hpfilter, False)
 
-        return convolverHP, convolvers, filterStorage
+        return convolvers, convolversHP, filterStorage
 
     def close(self):
         self.log.info('BinSim: close')
@@ -301,10 +363,8 @@ class BinSim(object):
 
         for n in range(self.maxChannels):
             self.convolvers[n].close()
-
-        if self.config.get('useHeadphoneFilter'):
-            if self.convolverHP:
-                self.convolverHP.close()
+            if self.convolversHP:
+                self.convolversHP[n].close()
 
 
 
@@ -320,36 +380,33 @@ class BinSim(object):
             if self.spatialize[convChannel] == False:
                 filter = self.filterStorage.get_filter(Pose.from_filterValueList(list([0.0, 0.0, 1, 0, 0, 0])))
                 dir_filter = self.filterStorage.get_directivity_filter(Pose.from_filterValueList(list([0.0, 0.0, 0, 0, 0, 0] + [ 0, 0, 0])))
-                self.convolvers[convChannel].setIR(filter, self.config.get('enableCrossfading'), dist, dir_filter)
+                self.convolvers[convChannel].setIR(filter, self.enableCrossfading, dist, dir_filter)
 
-                if self.config.get('useSplittedFilters'):
+                if self.useSplittedFilters:
                     lr_filter = self.filterStorage.get_late_reverb_filter(Pose.from_filterValueList(list([0, 0, 1, 0, 0, 0] + [ 0, 0, 0])))
-                    self.convolvers[convChannel].setLateReverb(lr_filter, self.config.get('enableCrossfading'))
+                    self.convolvers[convChannel].setLateReverb(lr_filter, self.enableCrossfading)
 
             else:
                 filterValueList = self.poseParser.get_current_values(convChannel)
                 filter = self.filterStorage.get_filter(Pose.from_filterValueList(filterValueList))
                 fvl = list(filterValueList[3:]) + [ 0, 0, 0]
                 dir_filter = self.filterStorage.get_directivity_filter(Pose.from_filterValueList(fvl))
-                self.convolvers[convChannel].setIR(filter, self.config.get('enableCrossfading'), dist, dir_filter)
+                self.convolvers[convChannel].setIR(filter, self.enableCrossfading, dist, dir_filter)
 
-                if self.config.get('useSplittedFilters'):
+                if self.useSplittedFilters:
                     lr_filter = self.filterStorage.get_late_reverb_filter(Pose.from_filterValueList(filterValueList))
-                    self.convolvers[convChannel].setLateReverb(lr_filter, self.config.get('enableCrossfading'))
-        
-        self.result[:, 0], self.result[:, 1] = self.convolvers[convChannel].process(self.block)
+                    self.convolvers[convChannel].setLateReverb(lr_filter, self.enableCrossfading)
         
+        self.convolvers[convChannel].process(self.block, out=self.result)
 
+        # Headphone equalization, if it is not already part of the filters
+        if self.convolversHP:
+            self.convolversHP[convChannel].process(self.result, out=self.result)
 
-        # Apply headphone filter
-        if self.config.get('useHeadphoneFilter'):
-            self.result[:, 0], self.result[:, 1], _ = self.convolverHP.process(self.result)
-            
-        # Scale data if required
-        self.result = np.multiply(
-            self.result, self.config.get('loudnessFactor'))
+        # Scale data in-place; the clipping check reads the block without allocating temporaries
+        np.multiply(self.result, self.loudnessFactor, out=self.result)
 
-        if np.max(np.abs(self.result)) > 1:
+        if self.result.max() > 1 or self.result.min() < -1:
             self.log.warn('Clipping occurred: Adjust loudnessFactor!')
 
         # if self.block.size < self.blockSize:
@@ -420,10 +477,6 @@ def audio_callback(binsim):
                     binsim.result[:, 0] = np.add(binsim.result[:, 0], left)
                     binsim.result[:, 1] = np.add(binsim.result[:, 1], right)
 
-            # Finally apply Headphone Filter
-            if callback.config.get('useHeadphoneFilter'):
-                binsim.result[:, 0], binsim.result[:, 1] = binsim.convolverHP.process(binsim.result)
-
         # Scale data
         binsim.result = np.divide(binsim.result, float((amount_channels) * 2))
         binsim.result = np.multiply(binsim.result, callback.config.get('loudnessFactor'))
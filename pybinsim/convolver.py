@@ -21,16 +21,53 @@
 # SOFTWARE.
 
 import logging
-import multiprocessing
-import pickle
-from pathlib import Path
+import math
+from collections import OrderedDict
 from timeit import default_timer
 
 import numpy as np
 import pyfftw
 
+from pybinsim import fftw_wisdom
+from pybinsim.utility import crossfade_windows
 
-nThreads = multiprocessing.cpu_count()
+
+# Plans measured in previous sessions make FFTW_MEASURE planning almost free
+fftw_wisdom.import_wisdom()
+
+# FFTW plans shared by all convolvers, keyed by transform, input shape and planning options.
+# Convolvers execute them on their own arrays through pyFFTW's new-array interface (update_arrays),
+# so each transform size is planned once per process
+shared_fftw_plans = {}
+
+
+def get_shared_fftw_plan(builder, input_shape, input_dtype, threads, planner_effort, padded_size=None):
+    """
+    Return the shared plan for a transform, planning it on first use
+
+    :param builder: pyfftw.builders function, e.g. pyfftw.builders.rfft
+    :param input_shape: shape of the input arrays
+    :param input_dtype: dtype of the input arrays
+    :param threads: number of FFTW threads
+    :param planner_effort: FFTW planner effort
+    :param padded_size: allocated length of the last axis, if the input arrays are views on padded arrays
+    :return: pyfftw.FFTW object
+    """
+    key = (builder.__name__, input_shape, np.dtype(input_dtype), threads, planner_effort, padded_size)
+    plan = shared_fftw_plans.get(key)
+
+    if plan is None:
+        if padded_size is None:
+            padded_size = input_shape[-1]
+        input_array = pyfftw.zeros_aligned(input_shape[:-1] + (padded_size,), dtype=input_dtype)[..., :input_shape[-1]]
+        plan = builder(input_array, overwrite_input=True, threads=threads, planner_effort=planner_effort,
+                       avoid_copy=True, auto_contiguous=False)
+        shared_fftw_plans[key] = plan
+
+        # save FFTW plans to recover for next pyBinSim session
+        fftw_wisdom.export_wisdom()
+
+    return plan
 
 
 class ConvolverFFTW(object):
@@ -39,37 +76,59 @@ class ConvolverFFTW(object):
     with a BRIRsor HRTF
     """
 
-    def __init__(self, ir_size, block_size, process_stereo, useSplittedFilters = False, lateReverbSize = 0):
+    # Maximum number and total size in bytes of the combined filters (filter * directivity * distance) kept by setIR
+    filterCacheSize = 32
+    filterCacheMemory = 4 * 1024 * 1024
+
+    # Distances are rounded to this number of significant digits, so slowly moving sources still hit the filter
+    # cache. The gain error is at most 0.05% (about 0.004 dB) for near and far sources alike
+    distanceDigits = 4
+
+    def __init__(self, ir_size, block_size, process_stereo, useSplittedFilters = False, lateReverbSize = 0, threads = 1,
+                 filterExtension = 0):
         start = default_timer()
 
         self.log = logging.getLogger("pybinsim.ConvolverFFTW")
         self.log.info("Convolver: Start Init")
 
         # pyFFTW Options
-        pyfftw.interfaces.cache.enable()
         self.fftw_planning_effort = 'FFTW_MEASURE'
         # self.fftw_planning_effort = 'FFTW_PATIENT'
         # self.fftw_planning_effort = 'FFTW_ESTIMATE'
         # self.fftw_planning_effort ='FFTW_EXHAUSTIVE' # takes 5..10 minutes
 
+        # Transforms of 2*block_size samples are too small to gain from FFTW's threading;
+        # more threads only add synchronisation overhead on every block
+        self.fftw_threads = threads
+
         # Get Basic infos
         self.IR_size = ir_size
         self.block_size = block_size
         self.reverbSize = lateReverbSize
         self.late_IR_blocks = 0
+
+        # Filters (and late reverb filters) with a merged headphone filter are longer than their nominal size
+        # by filterExtension samples, a multiple of block_size
+        self.filterExtension = filterExtension
         
         self.useSplittedFilters = useSplittedFilters
         
         if self.useSplittedFilters:
             # Needed for concatenating filters
-            self.late_IR_blocks = self.reverbSize // block_size
+            self.late_IR_blocks = (self.reverbSize + self.filterExtension) // block_size
             # Size used for convolution changes
             self.IR_size += self.reverbSize
+        self.IR_size += self.filterExtension
 
         # floor (integer) division in python 2 & 3
         self.IR_blocks = self.IR_size // block_size
 
         self.late_early_transition = self.IR_blocks - self.late_IR_blocks
+
+        # The late part starts at the nominal end of the early part, so the extension of the early filters
+        # overlaps the late part and is added to it when the filters are built
+        self.early_IR_blocks = (ir_size + self.filterExtension) // block_size
+        self.early_overlap_blocks = self.early_IR_blocks - self.late_early_transition
         
         # Calculate LINEAR crossfade windows
         #self.crossFadeIn = np.array(range(0, self.block_size), dtype='float32')
@@ -77,78 +136,103 @@ class ConvolverFFTW(object):
         #self.crossFadeOut = np.flipud(self.crossFadeIn)
 
         # Calculate time domain COSINE-Square crossfade windows
-        self.crossFadeOut = np.array(range(0, self.block_size), dtype='float32')
-        self.crossFadeOut = np.square(
-            np.cos(self.crossFadeOut/(self.block_size-1)*(np.pi/2)))
-        self.crossFadeIn = np.flipud(self.crossFadeOut)
+        self.crossFadeOut, self.crossFadeIn = crossfade_windows(self.block_size)
 
         # Filter format: [nBlocks,blockSize*2]
 
-        #pn_temporary = Path(__file__).parent.parent / "tmp"
-        #fn_wisdom = pn_temporary / "fftw_wisdom.pickle"
-        #if pn_temporary.exists() and fn_wisdom.exists():
-        #    loaded_wisdom = pickle.load(open(fn_wisdom, 'rb'))
-        #    pyfftw.import_wisdom(loaded_wisdom)
+        # Select mono or stereo processing
+        self.processStereo = process_stereo
+        self.fill_buffer = self.fill_buffer_stereo if self.processStereo else self.fill_buffer_mono
 
-        # Create Input Buffers and create fftw plans. These need to be memory aligned, because they are transformed to
-        # freq domain regularly
+        # Create Input Buffers and get fftw plans. These need to be memory aligned, because they are transformed to
+        # freq domain regularly. Stereo input uses one buffer row per channel, transformed with a single plan
         self.log.info("Convolver: Start Init buffer fft plans")
-        self.buffer = pyfftw.zeros_aligned(self.block_size * 2, dtype='float32')
-        self.bufferFftPlan = pyfftw.builders.rfft(self.buffer, overwrite_input=True, threads=nThreads,
-                                                  planner_effort=self.fftw_planning_effort, avoid_copy=True)
-
-        self.buffer2 = pyfftw.zeros_aligned(
-            self.block_size * 2, dtype='float32')
-        self.buffer2FftPlan = pyfftw.builders.rfft(self.buffer2, overwrite_input=True, threads=nThreads,
-                                                   planner_effort=self.fftw_planning_effort, avoid_copy=True)
+        if self.processStereo:
+            self.buffer = pyfftw.zeros_aligned((2, self.block_size * 2), dtype='float32')
+        else:
+            self.buffer = pyfftw.zeros_aligned(self.block_size * 2, dtype='float32')
+        self.bufferFftPlan = get_shared_fftw_plan(pyfftw.builders.rfft, self.buffer.shape, self.buffer.dtype,
+                                                  self.fftw_threads, self.fftw_planning_effort)
+        self.bufferSpectrum = pyfftw.zeros_aligned(self.bufferFftPlan.output_shape, dtype='complex64')
 
         # Create arrays for the filters and the FDLs.
+        # Both ears are stored in one array (first axis), so they are processed with a single call;
+        # the *_left/*_right attributes are views on these arrays.
+        # All arrays read by the complex multiply and add are aligned to 64 bytes (cache line, AVX-512).
+        # Their rows are padded from block_size + 1 to a multiple of 8 bins, so every row starts on a
+        # cache line and row strides avoid the critical strides of large powers of two. The padding bins
+        # stay zero; the complex multiply and add runs over the whole padded rows, everything else uses
+        # views on the first bin_count bins
         self.log.info("Convolver: Start Init filter fft plans")
+        self.bin_count = self.block_size + 1
+        self.bin_stride = (self.bin_count + 7) & ~7
+
+        self.TF_late_blocked = pyfftw.zeros_aligned((2, self.late_IR_blocks, self.bin_stride), dtype='complex64', n=64)
+        self.TF_late_left_blocked = self.TF_late_blocked[0, :, :self.bin_count]
+        self.TF_late_right_blocked = self.TF_late_blocked[1, :, :self.bin_count]
+        self.TF_early_overlap = np.zeros((2, self.early_overlap_blocks, self.bin_stride), dtype='complex64')
+
+        self.TF_blocked = pyfftw.zeros_aligned((2, self.IR_blocks, self.bin_stride), dtype='complex64', n=64)
+        self.TF_left_blocked = self.TF_blocked[0, :, :self.bin_count]
+        self.TF_right_blocked = self.TF_blocked[1, :, :self.bin_count]
+        self.TF_blocked_previous = pyfftw.zeros_aligned((2, self.IR_blocks, self.bin_stride), dtype='complex64', n=64)
+        self.TF_left_blocked_previous = self.TF_blocked_previous[0, :, :self.bin_count]
+        self.TF_right_blocked_previous = self.TF_blocked_previous[1, :, :self.bin_count]
         
-        self.TF_late_left_blocked = np.zeros((self.late_IR_blocks, self.block_size + 1), dtype='complex64')
-        self.TF_late_right_blocked = np.zeros((self.late_IR_blocks, self.block_size + 1), dtype='complex64')
-        
-        self.TF_left_blocked = np.zeros((self.IR_blocks, self.block_size + 1), dtype='complex64')
-        self.TF_right_blocked = np.zeros((self.IR_blocks, self.block_size + 1), dtype='complex64')
-        self.TF_left_blocked_previous = np.zeros((self.IR_blocks, self.block_size + 1), dtype='complex64')
-        self.TF_right_blocked_previous = np.zeros((self.IR_blocks, self.block_size + 1), dtype='complex64')
-        
-        self.FDL_left = np.zeros((self.IR_blocks, self.block_size + 1), dtype='complex64')
-        self.FDL_right = np.zeros((self.IR_blocks, self.block_size + 1), dtype='complex64')
+        # The FDLs are ring buffers which store every spectrum twice (at fdl_head and fdl_head + IR_blocks),
+        # so the last IR_blocks spectra are always available as one contiguous slice starting at fdl_head.
+        # Mono input feeds the same spectrum to both ears, so only one FDL is kept and broadcast in the
+        # complex multiply
+        fdl_channels = 2 if self.processStereo else 1
+        self.FDL = pyfftw.zeros_aligned((fdl_channels, 2 * self.IR_blocks, self.bin_stride), dtype='complex64', n=64)
+        self.FDL_bins = self.FDL[:, :, :self.bin_count]
+        self.FDL_left = self.FDL_bins[0]
+        self.FDL_right = self.FDL_bins[-1]
+        self.fdl_head = 0
+
+        # The FDL layout is fixed for the lifetime of the convolver, so the views used for every head
+        # position are created once here instead of slicing the FDLs on every block:
+        # the window read by the complex multiply and add and the two positions written by store_spectrum
+        self.fdl_windows = [self.FDL[:, head:head + self.IR_blocks] for head in range(self.IR_blocks)]
+        self.fdl_positions = [(self.FDL_bins[:, head], self.FDL_bins[:, head + self.IR_blocks])
+                              for head in range(self.IR_blocks)]
+
+        # Scratch buffer for the complex multiply of filter and FDL blocks; reused every block
+        self.productBuffer = pyfftw.zeros_aligned((2, self.IR_blocks, self.bin_stride), dtype='complex64', n=64)
 
         # Arrays for the result of the complex multiply and add
-        # These should be memory aligned because ifft is performed with these data
-        self.resultLeftFreq = pyfftw.zeros_aligned(self.block_size + 1, dtype='complex64')
-        self.resultRightFreq = pyfftw.zeros_aligned(self.block_size + 1, dtype='complex64')
-        self.resultLeftFreqPrevious = pyfftw.zeros_aligned(self.block_size + 1, dtype='complex64')
-        self.resultRightFreqPrevious = pyfftw.zeros_aligned(self.block_size + 1, dtype='complex64')
-
+        # These should be memory aligned because ifft is performed with these data.
+        # The ifft reads the unpadded bins directly from the padded rows
+        self.resultFreq = pyfftw.zeros_aligned((2, self.bin_stride), dtype='complex64', n=64)
+        self.resultFreqBins = self.resultFreq[:, :self.bin_count]
+        self.resultLeftFreq = self.resultFreqBins[0]
+        self.resultRightFreq = self.resultFreqBins[1]
+        self.resultFreqPrevious = pyfftw.zeros_aligned((2, self.bin_stride), dtype='complex64', n=64)
+        self.resultFreqPreviousBins = self.resultFreqPrevious[:, :self.bin_count]
+        self.resultLeftFreqPrevious = self.resultFreqPreviousBins[0]
+        self.resultRightFreqPrevious = self.resultFreqPreviousBins[1]
+
+        # The same plan transforms the current and the previous result
         self.log.info("Convolver: Start Init result ifft plans")
-        self.resultLeftIFFTPlan = pyfftw.builders.irfft(self.resultLeftFreq,
-                                                        overwrite_input=True, threads=nThreads,
-                                                        planner_effort=self.fftw_planning_effort, avoid_copy=True)
-        self.resultRightIFFTPlan = pyfftw.builders.irfft(self.resultRightFreq,
-                                                         overwrite_input=True, threads=nThreads,
-                                                         planner_effort=self.fftw_planning_effort, avoid_copy=True)
-
-        self.log.info("Convolver: Start Init result prvieous fft plans")
-        self.resultLeftPreviousIFFTPlan = pyfftw.builders.irfft(self.resultLeftFreqPrevious,
-                                                                overwrite_input=True, threads=nThreads,
-                                                                planner_effort=self.fftw_planning_effort, avoid_copy=True)
-        self.resultRightPreviousIFFTPlan = pyfftw.builders.irfft(self.resultRightFreqPrevious,
-                                                                 overwrite_input=True, threads=nThreads,
-                                                                 planner_effort=self.fftw_planning_effort, avoid_copy=True)
+        self.resultIFFTPlan = get_shared_fftw_plan(pyfftw.builders.irfft, self.resultFreqBins.shape,
+                                                   self.resultFreqBins.dtype, self.fftw_threads,
+                                                   self.fftw_planning_effort, padded_size=self.bin_stride)
+        self.ifftResult = pyfftw.zeros_aligned(self.resultIFFTPlan.output_shape, dtype='float32')
+        self.ifftResultPrevious = pyfftw.zeros_aligned(self.resultIFFTPlan.output_shape, dtype='float32')
 
-        # save FFTW plans to recover for next pyBinSim session
-        #collected_wisdom = pyfftw.export_wisdom()
-        #if not pn_temporary.exists():
-        #    pn_temporary.mkdir(parents=True)
-        #pickle.dump(collected_wisdom, open(fn_wisdom, "wb"))
+        # The plans are run with execute() instead of __call__. This skips the array checks of pyFFTW's
+        # __call__ and its normalisation of the inverse transform, so the 1/N scaling of the inverse
+        # transform is applied to the filters in setIR/setLateReverb instead
+        self.ifftScaling = 1 / (2 * self.block_size)
 
         # Result of the ifft is stored here
         self.outputLeft = np.zeros(self.block_size, dtype='float32')
         self.outputRight = np.zeros(self.block_size, dtype='float32')
 
+        # Views on the valid (second) half of the ifft outputs
+        self.ifftOutput = self.ifftResult[:, self.block_size:]
+        self.ifftOutputPrevious = self.ifftResultPrevious[:, self.block_size:]
+
         # Counts how often process() is called
         self.processCounter = 0
 
@@ -158,8 +242,17 @@ class ConvolverFFTW(object):
         # Flag which initiates filter rebuild (combining early and late part)
         self.buildNewFilter = False
 
-        # Select mono or stereo processing
-        self.processStereo = process_stereo
+        # Combined filters from setIR, least recently used first.
+        # Each entry holds the early transfer functions of both ears, so the number of entries is limited by memory too
+        self.filterCache = OrderedDict()
+        cache_entry_size = 2 * self.early_IR_blocks * self.bin_count * np.dtype('complex64').itemsize
+        self.filterCacheEntries = max(1, min(self.filterCacheSize, self.filterCacheMemory // cache_entry_size))
+
+        # Output is silent while no filter is set or after enough silent input blocks to clear the FDLs
+        self.filterAvailable = False
+        self.silentBlockCount = 0
+        self.silence = np.zeros((2, self.block_size), dtype='float32')
+        self.silence.flags.writeable = False
 
         end = default_timer()
         delta = end - start
@@ -205,15 +298,16 @@ class ConvolverFFTW(object):
         
         # Attach late part; Filter will be shorter by one block afterwards
         if self.useSplittedFilters and self.buildNewFilter:
-            # Overlapping of direct and late filters is not needed in this scenario
-            
             # Add all other late filter blocks
-            self.TF_left_blocked[self.late_early_transition:, :] = self.TF_late_left_blocked[0:, :]
-            self.TF_right_blocked[self.late_early_transition:, :] = self.TF_late_right_blocked[0:, :]
+            self.TF_blocked[:, self.late_early_transition:, :] = self.TF_late_blocked
+
+            # Early filters only overlap the late part if they are extended (merged headphone filter)
+            if self.early_overlap_blocks:
+                self.TF_blocked[:, self.late_early_transition:self.early_IR_blocks, :] += self.TF_early_overlap
 
             self.buildNewFilter = False
 
-    def setIR(self, filter, do_interpolation, dist=1, dir_filter=1):
+    def setIR(self, filter, do_interpolation, dist=1, dir_filter=None):
         """
         Hand over a new set of filters to the convolver
         and define if you want to perform an interpolation/crossfade
@@ -225,19 +319,53 @@ class ConvolverFFTW(object):
         :return: None
         """
         
-        left, right = filter.getFilterFD()
-        dir_left, dir_right = dir_filter.getFilterFD()
+        dist = self.quantize_distance(dist)
+        key = (id(filter), id(dir_filter), dist)
+        combined = self.filterCache.get(key)
+
+        if combined is None:
+            left, right = filter.getFilterFD()
+            left = left * (dist * self.ifftScaling)
+            right = right * (dist * self.ifftScaling)
+            if dir_filter is not None:
+                dir_left, dir_right = dir_filter.getFilterFD()
+                left *= dir_left
+                right *= dir_right
+
+            # filter objects are kept in the cache so their ids cannot be reused while the entry exists
+            combined = (filter, dir_filter, left, right)
+            self.filterCache[key] = combined
+            if len(self.filterCache) > self.filterCacheEntries:
+                self.filterCache.popitem(last=False)
+        else:
+            self.filterCache.move_to_end(key)
 
-        # TODO: replace with numpy multiplication
-        self.TF_left_blocked[0:self.late_early_transition, :] = left * dir_left * dist
-        self.TF_right_blocked[0:self.late_early_transition, :] = right * dir_right * dist
+        self.TF_left_blocked[0:self.late_early_transition, :] = combined[2][:self.late_early_transition]
+        self.TF_right_blocked[0:self.late_early_transition, :] = combined[3][:self.late_early_transition]
+        if self.early_overlap_blocks:
+            self.TF_early_overlap[0, :, :self.bin_count] = combined[2][self.late_early_transition:]
+            self.TF_early_overlap[1, :, :self.bin_count] = combined[3][self.late_early_transition:]
 
         # Interpolation means cross fading the output blocks (linear interpolation)
         self.interpolate = do_interpolation
 
         # apply new filters
         self.buildNewFilter = True
+        self.filterAvailable = True
     
+    def quantize_distance(self, dist):
+        """
+        Round a distance to distanceDigits significant digits
+
+        :param dist: distance between source and listener
+        :return: rounded distance as float
+        """
+        dist = float(dist)
+        if dist == 0 or not math.isfinite(dist):
+            return dist
+
+        return round(dist, self.distanceDigits - 1 - math.floor(math.log10(abs(dist))))
+
     def setLateReverb(self, filter, do_interpolation):
         """
         Hand over latereverb filter to the convolver
@@ -246,18 +374,46 @@ class ConvolverFFTW(object):
         :return: None
         """
         left, right = filter.getFilterFD()
-        self.TF_late_left_blocked[0:self.late_IR_blocks, :] = left
-        self.TF_late_right_blocked[0:self.late_IR_blocks, :] = right
+        np.multiply(left, self.ifftScaling, out=self.TF_late_left_blocked[0:self.late_IR_blocks, :])
+        np.multiply(right, self.ifftScaling, out=self.TF_late_right_blocked[0:self.late_IR_blocks, :])
 
         # Interpolation means cross fading the output blocks (linear interpolation)
         self.interpolate = do_interpolation
 
         self.buildNewFilter = True
+        self.filterAvailable = True
     
     def saveOldFilters(self):
         # Save old filters in case interpolation is needed
-        self.TF_left_blocked_previous[:] = self.TF_left_blocked
-        self.TF_right_blocked_previous[:] = self.TF_right_blocked
+        self.TF_blocked_previous[:] = self.TF_blocked
+
+    def multiply_accumulate(self, tf, fdl, result):
+        """
+        Complex multiply of filter and FDL blocks, accumulated over all blocks.
+        The product is written to a preallocated buffer and the sum goes directly into result
+
+        :param tf: blocked transfer function
+        :param fdl: frequency domain delay line
+        :param result: output array for the accumulated spectrum
+        :return: None
+        """
+        # np.einsum('...mk,...mk->...k', tf, fdl, out=result) would avoid the product buffer, but numpy has no
+        # vectorized complex sum-of-products loop and it is 2-3 times slower than the two vectorized passes here
+        np.multiply(tf, fdl, out=self.productBuffer)
+        np.sum(self.productBuffer, axis=-2, out=result)
+
+    @staticmethod
+    def execute_plan(plan, input_array, output_array):
+        """
+        Execute a (shared) FFTW plan on the given arrays
+
+        :param plan: pyfftw.FFTW object
+        :param input_array: input, with shape and alignment of the planned input
+        :param output_array: output, with shape and alignment of the planned output
+        :return: None
+        """
+        plan.update_arrays(input_array, output_array)
+        plan.execute()
 
     def process_nothing(self):
         """
@@ -266,6 +422,17 @@ class ConvolverFFTW(object):
         """
         self.processCounter += 1
 
+    def store_spectrum(self, spectrum):
+        """
+        Write the newest spectrum to both positions of the FDL ring buffers
+
+        :param spectrum: spectrum of the current input buffer; one row per FDL
+        :return: None
+        """
+        first, second = self.fdl_positions[self.fdl_head]
+        np.copyto(first, spectrum)
+        np.copyto(second, spectrum)
+
     def fill_buffer_mono(self, block):
         """
         Copy mono soundblock to input Buffer;
@@ -288,17 +455,17 @@ class ConvolverFFTW(object):
             self.buffer[:self.block_size] = self.buffer[self.block_size:]
             # insert new block to buffer
             self.buffer[self.block_size:] = block
-            # shift FDLs
-            self.FDL_left = np.roll(self.FDL_left, 1, axis=0)
-            self.FDL_right = np.roll(self.FDL_right, 1, axis=0)
+            # advance FDLs
+            self.fdl_head = (self.fdl_head - 1) % self.IR_blocks
 
         # transform buffer into freq domain and copy to FDLs
-        self.FDL_left[0, ] = self.FDL_right[0, ] = self.bufferFftPlan(self.buffer)
+        self.execute_plan(self.bufferFftPlan, self.buffer, self.bufferSpectrum)
+        self.store_spectrum(self.bufferSpectrum)
 
 
     def fill_buffer_stereo(self, block):
         """
-        Copy stereo soundblock to input Buffer1 and Buffer2;
+        Copy stereo soundblock to the two rows of the input buffer;
         Transform to Freq. Domain and store result in FDLs
 
         :param block:
@@ -313,39 +480,50 @@ class ConvolverFFTW(object):
 
         if self.processCounter == 0:
             # insert first block to buffer
-            self.buffer[self.block_size:] = block[:, 0]
-            self.buffer2[self.block_size:] = block[:, 1]
+            self.buffer[:, self.block_size:] = block.T
 
         else:
             # shift buffer
-            self.buffer[:self.block_size] = self.buffer[self.block_size:]
-            self.buffer2[:self.block_size] = self.buffer2[self.block_size:]
+            self.buffer[:, :self.block_size] = self.buffer[:, self.block_size:]
             # insert new block to buffer
-            self.buffer[self.block_size:] = block[:, 0]
-            self.buffer2[self.block_size:] = block[:, 1]
-            # shift FDLs
-            self.FDL_left = np.roll(self.FDL_left, 1, axis=0)
-            self.FDL_right = np.roll(self.FDL_right, 1, axis=0)
+            self.buffer[:, self.block_size:] = block.T
+            # advance FDLs
+            self.fdl_head = (self.fdl_head - 1) % self.IR_blocks
 
         # transform buffer into freq domain and copy to FDLs
-        self.FDL_left[0,] = self.bufferFftPlan(self.buffer)
-        self.FDL_right[0,] = self.buffer2FftPlan(self.buffer2)
+        self.execute_plan(self.bufferFftPlan, self.buffer, self.bufferSpectrum)
+        self.store_spectrum(self.bufferSpectrum)
 
-    def process(self, block):
+    def process(self, block, out=None):
         """
         Main function
 
         :param block:
+        :param out: optional array of shape (block_size, 2) which receives the output of both ears
         :return: (outputLeft, outputRight)
         """
 
-        # First: Fill buffer and FDLs with current block
-        if not self.processStereo:
-            # print('Convolver Mono Processing')
-            self.fill_buffer_mono(block)
+        if block.any():
+            self.silentBlockCount = 0
         else:
-            # print('Convolver Stereo Processing')
-            self.fill_buffer_stereo(block)
+            self.silentBlockCount += 1
+
+        # After more than IR_blocks silent blocks all spectra in the FDLs are zero and so is the output.
+        # The FDLs are not updated while skipping; once input returns, the remaining stale spectrum
+        # drops out of the window when the FDLs advance
+        if self.silentBlockCount > self.IR_blocks:
+            self.buildFilters()
+            self.processCounter += 1
+            self.interpolate = False
+            return self.write_output(self.silence, out)
+
+        # First: Fill buffer and FDLs with current block
+        self.fill_buffer(block)
+
+        # Nothing to convolve with until the first filter is set
+        if not self.filterAvailable:
+            self.processCounter += 1
+            return self.write_output(self.silence, out)
 
         # Save previous filters
         self.saveOldFilters()
@@ -353,29 +531,45 @@ class ConvolverFFTW(object):
         # Rebuild filter
         self.buildFilters()
         
+        # Current window of the FDLs, newest spectrum first
+        fdl = self.fdl_windows[self.fdl_head]
+
         # Second: Multiplication with IR block und accumulation with previous data
-        self.resultLeftFreq[:] = np.sum(np.multiply(self.TF_left_blocked,self.FDL_left), axis=0)
-        self.resultRightFreq[:] = np.sum(np.multiply(self.TF_right_blocked,self.FDL_right), axis=0)
+        self.multiply_accumulate(self.TF_blocked, fdl, self.resultFreq)
 
         # Third: Transformation back to time domain
-        self.outputLeft = self.resultLeftIFFTPlan()[self.block_size:self.block_size * 2]
-        self.outputRight = self.resultRightIFFTPlan()[self.block_size:self.block_size * 2]
+        self.execute_plan(self.resultIFFTPlan, self.resultFreqBins, self.ifftResult)
+        self.outputLeft, self.outputRight = self.ifftOutput
         
         # Crossfade
         # Also convolute old filter if interpolation needed
         if self.interpolate:
-            self.resultLeftFreqPrevious[:] = np.sum(np.multiply(self.TF_left_blocked_previous, self.FDL_left), axis=0)
-            self.resultRightFreqPrevious[:] = np.sum(np.multiply(self.TF_right_blocked_previous, self.FDL_right), axis=0)
-            # fade over full block size
-            self.outputLeft = np.add(np.multiply(self.outputLeft, self.crossFadeIn),
-                                     np.multiply(self.resultLeftPreviousIFFTPlan()[self.block_size:self.block_size * 2], self.crossFadeOut))
-            self.outputRight = np.add(np.multiply(self.outputRight, self.crossFadeIn),
-                                      np.multiply(self.resultRightPreviousIFFTPlan()[self.block_size:self.block_size*2], self.crossFadeOut))
+            self.multiply_accumulate(self.TF_blocked_previous, fdl, self.resultFreqPrevious)
+            self.execute_plan(self.resultIFFTPlan, self.resultFreqPreviousBins, self.ifftResultPrevious)
+            # fade over full block size: current * crossFadeIn + previous * crossFadeOut.
+            # Both windows sum to one, so this is computed in-place as previous + crossFadeIn * (current - previous)
+            np.subtract(self.ifftOutput, self.ifftOutputPrevious, out=self.ifftOutput)
+            np.multiply(self.ifftOutput, self.crossFadeIn, out=self.ifftOutput)
+            np.add(self.ifftOutput, self.ifftOutputPrevious, out=self.ifftOutput)
 
         self.processCounter += 1
         self.interpolate = False
 
-        return self.outputLeft, self.outputRight
+        return self.write_output(self.ifftOutput, out)
+
+    @staticmethod
+    def write_output(output, out):
+        """
+        Copy the output of both ears to the interleaved array out, if given
+
+        :param output: array of shape (2, block_size)
+        :param out: array of shape (block_size, 2) or None
+        :return: (outputLeft, outputRight)
+        """
+        if out is not None:
+            np.copyto(out.T, output)
+
+        return output[0], output[1]
 
     def close(self):
         print("Convolver: close")
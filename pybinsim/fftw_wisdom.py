@@ -0,0 +1,75 @@
+# This file is part of the pyBinSim project.
+#
+# Copyright (c) 2017 A. Neidhardt, F. Klein, N. Knoop, T. Köllmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+""" Module for keeping FFTW wisdom (measured plans) between pyBinSim sessions """
+import logging
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+import pyfftw
+
+logger = logging.getLogger("pybinsim.FFTWWisdom")
+
+# FFTW wisdom accumulates: imported wisdom is merged with newly measured plans and
+# exported again as a whole, so one file serves all block and filter sizes
+wisdom_path = Path.home() / ".cache" / "pybinsim" / "fftw_wisdom.pickle"
+
+# the file only needs to be read once per process
+wisdom_imported = False
+
+
+def import_wisdom():
+    """
+    Load FFTW wisdom saved by a previous session, if available and not loaded yet
+
+    :return: None
+    """
+    global wisdom_imported
+    if wisdom_imported or not wisdom_path.exists():
+        return
+    wisdom_imported = True
+
+    try:
+        with open(wisdom_path, 'rb') as wisdom_file:
+            pyfftw.import_wisdom(pickle.load(wisdom_file))
+        logger.info("Loaded FFTW wisdom from {}".format(wisdom_path))
+    except Exception as e:
+        logger.warning("Could not load FFTW wisdom from {}: {}".format(wisdom_path, e))
+
+
+def export_wisdom():
+    """
+    Save the current FFTW wisdom for the next session.
+    The file is replaced atomically, so concurrent sessions never read a partial file
+
+    :return: None
+    """
+    try:
+        wisdom_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temporary_path = tempfile.mkstemp(dir=wisdom_path.parent)
+        with os.fdopen(fd, 'wb') as wisdom_file:
+            pickle.dump(pyfftw.export_wisdom(), wisdom_file)
+        os.replace(temporary_path, wisdom_path)
+    except OSError as e:
+        logger.warning("Could not save FFTW wisdom to {}: {}".format(wisdom_path, e))
@@ -20,9 +20,11 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import functools
 import logging
 import multiprocessing as mp
 import enum
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import soundfile as sf
@@ -30,32 +32,77 @@ import soundfile as sf
 import pyfftw
 import time
 
+from pybinsim import fftw_wisdom
 from pybinsim.pose import Pose
-from pybinsim.utility import total_size
+from pybinsim.utility import crossfade_windows, total_size
 
-from scipy.spatial import KDTree
+from scipy.signal import fftconvolve
+from scipy.spatial import cKDTree
 
 nThreads = mp.cpu_count()
 
+# The trees only hold 2-D orientations and are built once; an unbalanced tree without
+# shrunk node boxes builds about three times faster and queries just as fast
+kdtree_options = dict(leafsize=32, balanced_tree=False, compact_nodes=False)
+
+
+@functools.lru_cache(maxsize=None)
+def silent_filter_blocks(ir_blocks, block_length, dtype):
+    """
+    Zero filter blocks returned when filter data is not available.
+    The array is shared by all filters of the same shape and therefore read-only
+
+    :param ir_blocks: number of blocks
+    :param block_length: number of samples or bins per block
+    :param dtype: data type of the blocks
+    :return: read-only array of zeros [ir_blocks, block_length]
+    """
+    blocks = np.zeros((ir_blocks, block_length), dtype=dtype)
+    blocks.flags.writeable = False
+    return blocks
+
 
 class Filter(object):
+    # One Filter is created for every entry of the filter list, so instances only keep a reference to their
+    # filter bank and their index in it and do without a per-instance attribute dict
+    __slots__ = ('ir_blocks', 'block_size', 'TF_blocks', 'TF_block_size', 'IR_left_blocked', 'IR_right_blocked',
+                 'ears', 'filename', 'index', 'fd_available', 'filter_bank')
 
-    def __init__(self, inputfilter, irBlocks, block_size, filename=None):
-        self.log = logging.getLogger("pybinsim.Filter")
+    log = logging.getLogger("pybinsim.Filter")
 
+    def __init__(self, inputfilter, irBlocks, block_size, filename=None):
         self.ir_blocks = irBlocks
         self.block_size = block_size
 
         self.TF_blocks = irBlocks
         self.TF_block_size = block_size + 1
     
-        self.IR_left_blocked = np.reshape(inputfilter[:, 0], (irBlocks, block_size))
-        self.IR_right_blocked = np.reshape(inputfilter[:, 1], (irBlocks, block_size))
+        if inputfilter is None:
+            # filter which only gets frequency domain data from a filter bank, see setFilterFD
+            self.ears = 2
+            self.IR_left_blocked = None
+            self.IR_right_blocked = None
+        else:
+            # mono filters (directivity) use the same data for both ears and are stored only once
+            self.ears = 1 if np.shape(inputfilter)[1] == 1 else 2
+            self.IR_left_blocked = np.reshape(inputfilter[:, 0], (irBlocks, block_size))
+            self.IR_right_blocked = np.reshape(inputfilter[:, self.ears - 1], (irBlocks, block_size))
         self.filename = filename
+
+        # filter bank [filter, ear, block, bin] holding the transfer functions and the position of this filter in it
+        self.filter_bank = None
+        self.index = None
         
         self.fd_available = False
-        self.TF_left_blocked = None
-        self.TF_right_blocked = None
+
+    # complex64 transfer functions as returned by getFilterFD, also for half precision banks
+    @property
+    def TF_left_blocked(self):
+        return self.getFilterFD()[0] if self.fd_available else None
+
+    @property
+    def TF_right_blocked(self):
+        return self.getFilterFD()[1] if self.fd_available else None
 
     def getFilter(self):
         return self.IR_left_blocked, self.IR_right_blocked
@@ -63,8 +110,7 @@ class Filter(object):
     def getFilterTD(self):
         if self.fd_available:
             self.log.warning("FilterStorage: No time domain filter available!")
-            left = np.zeros((self.ir_blocks, self.block_size))
-            right = np.zeros((self.ir_blocks, self.block_size))
+            left = right = silent_filter_blocks(self.ir_blocks, self.block_size, 'float32')
         else:
             left = self.IR_left_blocked
             right = self.IR_right_blocked
@@ -80,11 +126,26 @@ class Filter(object):
         self.IR_right_blocked[0, :] = np.multiply(self.IR_right_blocked[0, :], window)
 
     def storeInFDomain(self,fftw_plan):
-        self.TF_left_blocked = np.zeros((self.ir_blocks, self.block_size + 1), dtype='complex64')
-        self.TF_right_blocked = np.zeros((self.ir_blocks, self.block_size + 1), dtype='complex64')
+        filter_bank = np.zeros((1, self.ears, self.ir_blocks, self.block_size + 1), dtype='complex64')
+
+        for ear, ir_blocked in enumerate(self.getFilter()[:self.ears]):
+            filter_bank[0, ear] = fftw_plan(ir_blocked)
+        filter_bank.flags.writeable = False
+
+        self.setFilterFD(filter_bank, 0)
+
+    def setFilterFD(self, filter_bank, index):
+        """
+        Use frequency domain filters from a filter bank
 
-        self.TF_left_blocked [:] = fftw_plan(self.IR_left_blocked)
-        self.TF_right_blocked [:] = fftw_plan(self.IR_right_blocked)
+        :param filter_bank: array of blocked transfer functions [filter, ear, block, bin], with a single ear
+                            for mono filters
+        :param index: index of this filter in the bank
+        :return: None
+        """
+        self.filter_bank = filter_bank
+        self.index = index
+        self.ears = np.shape(filter_bank)[1]
 
         self.fd_available = True
 
@@ -95,11 +156,18 @@ class Filter(object):
     def getFilterFD(self):
         if not self.fd_available:
             self.log.warning("FilterStorage: No frequency domain filter available!")
-            left = np.zeros((self.ir_blocks, self.block_size+1))
-            right = np.zeros((self.ir_blocks, self.block_size+1))
+            left = right = silent_filter_blocks(self.ir_blocks, self.block_size + 1, 'complex64')
+        elif self.filter_bank.dtype == np.float16:
+            # half precision filters store real and imaginary parts interleaved
+            left = self.filter_bank[self.index, 0].astype(np.float32).view(np.complex64)
+            if self.ears == 1:
+                # a mono spectrum is shared by both ears, so it is read-only like the banks
+                left.flags.writeable = False
+            right = left if self.ears == 1 else self.filter_bank[self.index, 1].astype(np.float32).view(np.complex64)
         else:
-            left = self.TF_left_blocked
-            right = self.TF_right_blocked
+            # views of the read-only bank; for mono filters both ears share the same spectrum
+            left = self.filter_bank[self.index, 0]
+            right = self.filter_bank[self.index, -1]
 
         return left, right
 
@@ -108,30 +176,47 @@ class FilterType(enum.Enum):
     Filter = 1
     LateReverbFilter = 2
     Directivity = 3
+    HeadphoneFilter = 4
 
 class FilterStorage(object):
     """ Class for storing all filters mentioned in the filter list """
 
-    def __init__(self, irSize, block_size, filter_list_name, useHeadphoneFilter = False, headphoneFilterSize = 0, useSplittedFilters = False, lateReverbSize = 0, directivitySize = 0):
+    # number of filters which are read and transformed together while loading
+    load_chunk_size = 256
+
+    def __init__(self, irSize, block_size, filter_list_name, useHeadphoneFilter = False, headphoneFilterSize = 0, useSplittedFilters = False, lateReverbSize = 0, directivitySize = 0, useHalfPrecisionFilters = False):
         self.log = logging.getLogger("pybinsim.FilterStorage")
         self.log.info("FilterStorage: init")
+
+        # Store the filter banks as float16 to halve their memory; precision drops to about 1e-3
+        self.useHalfPrecisionFilters = useHalfPrecisionFilters
         
-        pyfftw.interfaces.cache.enable()
-        fftw_planning_effort ='FFTW_ESTIMATE'
+        # Plans are measured once and reused from the wisdom of previous sessions
+        fftw_wisdom.import_wisdom()
+        fftw_planning_effort ='FFTW_MEASURE'
+        self.fftw_planning_effort = fftw_planning_effort
+
+        # The headphone filter is convolved into the filters and late reverb filters while loading. The whole
+        # convolution is kept, so these filters get longer by the headphone filter size (in full blocks).
+        # The directivity weighting is applied later, per block, so this is only equivalent to equalizing the
+        # output if the directivity filters have a single block. Otherwise the headphone filter has to be applied
+        # to the output of the convolvers (see get_headphone_filter)
+        self.mergeHeadphoneFilter = useHeadphoneFilter and directivitySize // block_size <= 1
+        self.headphone_extension = 0
+        if self.mergeHeadphoneFilter:
+            self.headphone_extension = -(-headphoneFilterSize // block_size) * block_size
 
         self.ir_size = irSize
-        self.ir_blocks = irSize // block_size
+        self.ir_blocks = (irSize + self.headphone_extension) // block_size
         self.block_size = block_size
         
         self.filter_fftw_plan = pyfftw.builders.rfft(np.zeros((self.ir_blocks,self.block_size), dtype='float32'),n=self.block_size*2,axis = 1, threads=nThreads, planner_effort=fftw_planning_effort)
         
-        self.default_filter = Filter(np.zeros((self.ir_size, 2), dtype='float32'), self.ir_blocks, self.block_size)
+        self.default_filter = Filter(np.zeros((self.ir_blocks * self.block_size, 2), dtype='float32'), self.ir_blocks, self.block_size)
         self.default_filter.storeInFDomain(self.filter_fftw_plan)
         
         # Calculate COSINE-Square crossfade windows
-        self.crossFadeOut = np.array(range(0, self.block_size), dtype='float32')
-        self.crossFadeOut = np.square(np.cos(self.crossFadeOut/(self.block_size-1)*(np.pi/2)))
-        self.crossFadeIn = np.flipud(self.crossFadeOut)
+        self.crossFadeOut, self.crossFadeIn = crossfade_windows(self.block_size)
 
         self.useHeadphoneFilter = useHeadphoneFilter
         if useHeadphoneFilter:
@@ -146,47 +231,58 @@ class FilterStorage(object):
         self.useSplittedFilters = useSplittedFilters
         if useSplittedFilters:
             self.lateReverbSize = lateReverbSize
-            self.late_ir_blocks = lateReverbSize // block_size
+            self.late_ir_blocks = (lateReverbSize + self.headphone_extension) // block_size
 
             self.late_filter_fftw_plan = pyfftw.builders.rfft(np.zeros((self.late_ir_blocks, self.block_size), dtype='float32'),
                                                          n=self.block_size * 2, axis=1, overwrite_input=False,
                                                          threads=nThreads, planner_effort=fftw_planning_effort,
                                                          avoid_copy=False)
 
-            self.default_late_reverb_filter = Filter(np.zeros((self.lateReverbSize, 2), dtype='float32'), self.late_ir_blocks, self.block_size)
+            self.default_late_reverb_filter = Filter(np.zeros((self.late_ir_blocks * self.block_size, 2), dtype='float32'), self.late_ir_blocks, self.block_size)
             self.default_late_reverb_filter.storeInFDomain(self.late_filter_fftw_plan)
 
         # directivity
         self.directivitySize = directivitySize
         self.dir_ir_blocks = directivitySize // block_size
-        self.filter_fftw_plan = pyfftw.builders.rfft(np.zeros((self.dir_ir_blocks, self.block_size), dtype='float32'),
-                                                     n=self.block_size * 2, axis=1, overwrite_input=False,
-                                                     threads=nThreads, planner_effort=fftw_planning_effort,
-                                                     avoid_copy=False)
-        self.default_directivity_filter = Filter(np.zeros((self.directivitySize, 2), dtype='float32'), self.dir_ir_blocks, self.block_size)
-        self.default_directivity_filter.storeInFDomain(self.filter_fftw_plan)
+        self.dir_filter_fftw_plan = pyfftw.builders.rfft(np.zeros((self.dir_ir_blocks, self.block_size), dtype='float32'),
+                                                         n=self.block_size * 2, axis=1, overwrite_input=False,
+                                                         threads=nThreads, planner_effort=fftw_planning_effort,
+                                                         avoid_copy=False)
+        self.default_directivity_filter = Filter(np.zeros((self.directivitySize, 1), dtype='float32'), self.dir_ir_blocks, self.block_size)
+        self.default_directivity_filter.storeInFDomain(self.dir_filter_fftw_plan)
 
         self.filter_list_path = filter_list_name
-        self.filter_list = open(self.filter_list_path, 'r')
 
         self.headphone_filter = None
+        # time domain headphone filter which is merged into the filters while loading, see mergeHeadphoneFilter
+        self.headphone_ir = None
 
         # format: [key,{filter}]
         self.filter_dict = {}
         self.late_reverb_filter_dict = {}
         self.directivity_dict = {}
 
-        # Lists and KDTrees for filter searches
-        self.filter_arr = list(list())
-        self.late_reverb_arr = list(list())
-        self.directivity_arr = list(list())
-        self.filter_tree = 0
-        self.late_reverb_tree = 0
-        self.directivity_tree = 0
+        # Filter banks with the transfer functions of all filters of a type [filter, ear, block, bin].
+        # In half precision the last axis holds interleaved real and imaginary parts as float16
+        self.filter_bank = None
+        self.late_reverb_bank = None
+        self.directivity_bank = None
+
+        # Arrays of filter orientations [n_filters, 2] and KDTrees for filter searches.
+        # There is no tree for types without filters; searches then return the default filter
+        self.filter_arr = np.empty((0, 2))
+        self.late_reverb_arr = np.empty((0, 2))
+        self.directivity_arr = np.empty((0, 2))
+        self.filter_tree = None
+        self.late_reverb_tree = None
+        self.directivity_tree = None
 
         # Start to load filters
         self.load_filters()
 
+        # save FFTW plans to recover for next pyBinSim session
+        fftw_wisdom.export_wisdom()
+
     def parse_filter_list(self):
         """
         Generator for filter list lines
@@ -201,10 +297,14 @@ class FilterStorage(object):
         :return: Iterator of (Pose, filter-path) tuples
         """
 
-        for line in self.filter_list:
+        # read the whole list at once; the file is closed before any filter is loaded
+        with open(self.filter_list_path, 'r') as filter_list:
+            lines = filter_list.read().splitlines()
+
+        for line in lines:
 
             # comment out lines in the list with a '#'
-            if line.startswith('#') or line == "\n":
+            if line.startswith('#') or not line.strip():
                 continue
 
             line_content = line.split()
@@ -215,7 +315,8 @@ class FilterStorage(object):
             if line.startswith('HPFILTER'):
                 if self.useHeadphoneFilter:
                     self.log.info("Loading headphone filter: {}".format(filter_path))
-                    self.headphone_filter = Filter(self.load_filter(filter_path, FilterType.Filter), self.headphone_ir_blocks, self.block_size)
+                    self.headphone_ir = self.load_filter(filter_path, FilterType.HeadphoneFilter)
+                    self.headphone_filter = Filter(np.copy(self.headphone_ir), self.headphone_ir_blocks, self.block_size)
                     self.headphone_filter.storeInFDomain(self.hp_filter_fftw_plan)
                     continue
                 else:
@@ -270,128 +371,226 @@ class FilterStorage(object):
         start = time.time()
         parsed_filter_list = list(self.parse_filter_list())
 
-        for filter_pose, filter_path, filter_type in parsed_filter_list:
-        #for i, (pose, filter_path, filter_type) in enumerate(self.parse_filter_list()):
-            # Skip undefined types (e.g. old format)
-            if filter_type == FilterType.Undefined:
-                continue
-            
-            # check for missing filters and throw exception if not found
-            #if not Path(filter_path).exists():
-            #    self.log.warn(f'Wavefile not found: {fn_filter}')
-            #    raise FileNotFoundError(f'File {fn_filter} is missing.')
-            
-            self.log.debug(f'Loading {filter_path}')
-            if filter_type == FilterType.Filter:
-                # preprocess filters and put them in a dict
-                current_filter = Filter(self.load_filter(filter_path, filter_type), self.ir_blocks, self.block_size)
-                
-                # apply fade out to all filters
-                #current_filter.apply_fadeout(self.crossFadeOut)
+        if self.useHeadphoneFilter and self.headphone_ir is None:
+            raise RuntimeError("Headphone filter not loaded")
 
-                current_filter.storeInFDomain(self.filter_fftw_plan)
-                
-                # create key and store in dict
-                key = filter_pose.create_key()
-                self.filter_dict.update({key: current_filter})
+        # Skip undefined types (e.g. old format)
+        parsed_filter_list = [entry for entry in parsed_filter_list if entry[2] != FilterType.Undefined]
+
+        # The orientations of each type are converted to arrays (float64, as used by the KDTrees) in one go
+        self.filter_arr = self.orientation_array(parsed_filter_list, FilterType.Filter)
+        self.late_reverb_arr = self.orientation_array(parsed_filter_list, FilterType.LateReverbFilter)
+        self.directivity_arr = self.orientation_array(parsed_filter_list, FilterType.Directivity)
+
+        filter_entries = [entry for entry in parsed_filter_list if entry[2] == FilterType.Filter]
+        late_reverb_entries = [entry for entry in parsed_filter_list if entry[2] == FilterType.LateReverbFilter]
+        directivity_entries = [entry for entry in parsed_filter_list if entry[2] == FilterType.Directivity]
+
+        # keys of the filters in list order, i.e. in the order of the rows of the orientation arrays
+        filter_keys = [filter_pose.create_key() for filter_pose, _, _ in filter_entries]
+        late_reverb_keys = [filter_pose.create_key() for filter_pose, _, _ in late_reverb_entries]
+        directivity_keys = [filter_pose.create_key() for filter_pose, _, _ in directivity_entries]
+
+        # Reading and decoding the files releases the GIL, so they are read by a thread pool
+        with ThreadPoolExecutor(max_workers=nThreads) as executor:
+            self.filter_bank = self.load_filter_bank(executor, filter_entries, self.ir_blocks)
+            if self.useSplittedFilters:
+                self.late_reverb_bank = self.load_filter_bank(executor, late_reverb_entries, self.late_ir_blocks)
+            # directivity filters are mono, so only one spectrum per filter is computed and stored
+            self.directivity_bank = self.load_filter_bank(executor, directivity_entries, self.dir_ir_blocks, ears=1)
+
+        # create the filters on their part of the banks and store them in dicts by key
+        self.filter_dict.update(zip(filter_keys, self.filters_from_bank(self.filter_bank, self.ir_blocks)))
+        if self.useSplittedFilters:
+            self.late_reverb_filter_dict.update(zip(late_reverb_keys,
+                                                    self.filters_from_bank(self.late_reverb_bank, self.late_ir_blocks)))
+        self.directivity_dict.update(zip(directivity_keys,
+                                         self.filters_from_bank(self.directivity_bank, self.dir_ir_blocks)))
+
+        # Filters and keys for every row of the orientation arrays, so a KDTree search directly gives the filter.
+        # If a key is listed more than once, all its rows use the filter which was stored last in the dict
+        self.filter_keys = filter_keys
+        self.filter_objs = [self.filter_dict[key] for key in filter_keys]
+        self.late_reverb_keys = late_reverb_keys
+        self.late_reverb_objs = [self.late_reverb_filter_dict[key] for key in late_reverb_keys]
+        self.directivity_keys = directivity_keys
+        self.directivity_objs = [self.directivity_dict[key] for key in directivity_keys]
 
-                # add pose values to filter array
-                self.filter_arr.append(list(map(float, filter_pose.orientation[0:2])))
-            
-            if filter_type == FilterType.LateReverbFilter:
-                # preprocess late reverb filters and put them in a separate dict
-                current_filter = Filter(self.load_filter(filter_path, filter_type), self.late_ir_blocks, self.block_size)
-                
-                # apply fade in to all late reverb filters
-                #current_filter.apply_fadein(self.crossFadeIn)
+        # build KDTrees for filter list items to do nearest neighbour search
+        # TODO: KDTree for late reverb probably not needed, but... meh... maybe in the future it will
+        self.filter_tree = self.build_tree(self.filter_arr)
+        self.late_reverb_tree = self.build_tree(self.late_reverb_arr)
+        self.directivity_tree = self.build_tree(self.directivity_arr)
 
-                current_filter.storeInFDomain(self.late_filter_fftw_plan)
-                
-                #create key and store in dict
-                key = filter_pose.create_key()
-                self.late_reverb_filter_dict.update({key: current_filter})
+        end = time.time()
+        self.log.info("Finished loading filters in" + str(end-start) + "sec.")
+        #self.log.info("filter_dict size: {}MiB".format(total_size(self.filter_dict) // 1024 // 1024))
 
-                # add pose values to filter array
-                self.late_reverb_arr.append(list(map(float, filter_pose.orientation[0:2])))
+    @staticmethod
+    def build_tree(orientations):
+        """
+        Build a KDTree for the orientations of a filter type
 
-            if filter_type == FilterType.Directivity:
-                # preprocess late reverb filters and put them in a separate dict
-                current_filter = Filter(self.load_filter(filter_path, filter_type), self.dir_ir_blocks, self.block_size)
+        :param orientations: array of yaw and pitch values [n_filters, 2]
+        :return: cKDTree, or None if there are no filters of this type
+        """
+        if len(orientations) == 0:
+            return None
 
-                current_filter.storeInFDomain(self.filter_fftw_plan)
+        return cKDTree(orientations, **kdtree_options)
 
-                # create key and store in dict
-                key = filter_pose.create_key()
-                self.directivity_dict.update({key: current_filter})
+    @staticmethod
+    def orientation_array(parsed_filter_list, filter_type):
+        """
+        Convert the orientations of all filters of one type to an array
 
-                # add pose values to filter array
-                self.directivity_arr.append(list(map(float, filter_pose.orientation[0:2])))
+        :param parsed_filter_list: list of (Pose, filter-path, FilterType) tuples
+        :param filter_type: FilterType of the filters
+        :return: array of yaw and pitch values [n_filters, 2]
+        """
+        orientations = [filter_pose.orientation[0:2] for filter_pose, _, current_type in parsed_filter_list
+                        if current_type == filter_type]
 
-        # build KDTrees for filter list items to do nearest neighbour search
-        # TODO: KDTree for late reverb probably not needed, but... meh... maybe in the future it will
-        self.filter_tree = KDTree(self.filter_arr)
-        self.late_reverb_tree = KDTree(self.late_reverb_arr)
-        self.directivity_tree = KDTree(self.directivity_arr)
+        # numpy parses the strings of the filter list directly
+        return np.array(orientations, dtype=np.float64).reshape(-1, 2)
 
-        end = time.time()
-        self.log.info("Finished loading filters in" + str(end-start) + "sec.")
-        #self.log.info("filter_dict size: {}MiB".format(total_size(self.filter_dict) // 1024 // 1024))
+    def load_filter_bank(self, executor, filter_entries, ir_blocks, ears=2):
+        """
+        Load a group of filters with the same number of blocks and transform them to frequency domain.
+        The spectra of all filters are kept in one filter bank; both ears of a filter are stored next to each other.
+
+        The bank is allocated once and filled in chunks of load_chunk_size filters, which are read, transformed
+        with a single FFTW plan and then dropped, so only one chunk of time domain filters is held at a time
+
+        :param executor: thread pool reading the filter files
+        :param filter_entries: list of (Pose, filter-path, FilterType) tuples
+        :param ir_blocks: number of blocks of these filters
+        :param ears: 2 for binaural filters, 1 for mono filters which are used for both ears
+        :return: filter bank [filter, ear, block, bin]
+        """
+        n_filters = len(filter_entries)
+        if self.useHalfPrecisionFilters:
+            filter_bank = np.empty((n_filters, ears, ir_blocks, 2 * (self.block_size + 1)), dtype=np.float16)
+        else:
+            filter_bank = pyfftw.empty_aligned((n_filters, ears, ir_blocks, self.block_size + 1), dtype='complex64')
+
+        if n_filters == 0:
+            filter_bank.flags.writeable = False
+            return filter_bank
+
+        # The transform reads the zero padded blocks from an aligned staging array.
+        # format: [filter, ear, block, sample]
+        chunk_size = min(n_filters, self.load_chunk_size)
+        ir_blocked = pyfftw.empty_aligned((chunk_size, ears, ir_blocks, self.block_size * 2), dtype='float32')
+        spectra = pyfftw.empty_aligned((chunk_size, ears, ir_blocks, self.block_size + 1), dtype='complex64')
+
+        # FFTW_MEASURE overwrites the arrays while planning, so they are filled afterwards
+        fftw_plan = pyfftw.FFTW(ir_blocked, spectra, axes=(-1,), direction='FFTW_FORWARD',
+                                flags=(self.fftw_planning_effort, 'FFTW_DESTROY_INPUT'), threads=nThreads)
+
+        for start in range(0, n_filters, chunk_size):
+            chunk = filter_entries[start:start + chunk_size]
+
+            # each task reads a contiguous part of the chunk to keep the pool overhead small
+            task_size = -(-len(chunk) // nThreads)
+            tasks = [chunk[i:i + task_size] for i in range(0, len(chunk), task_size)]
+            loaded_filters = [loaded_filter for task in executor.map(self.read_filters, tasks)
+                              for loaded_filter in task]
+
+            # the input may have been destroyed by the previous transform
+            ir_blocked[..., self.block_size:] = 0
+            # the loaded filters are split into blocks while copying them into the aligned array
+            for i, loaded_filter in enumerate(loaded_filters):
+                ir_blocked[i, :, :, :self.block_size] = loaded_filter.T.reshape(ears, ir_blocks, self.block_size)
+            del loaded_filters
+
+            fftw_plan.execute()
+
+            # rows behind the end of a shorter last chunk hold stale data and are not copied
+            if self.useHalfPrecisionFilters:
+                filter_bank[start:start + len(chunk)] = spectra[:len(chunk)].view(np.float32)
+            else:
+                filter_bank[start:start + len(chunk)] = spectra[:len(chunk)]
+
+        # the spectra are shared by all users of the filters and must not be changed
+        filter_bank.flags.writeable = False
+        return filter_bank
+
+    def filters_from_bank(self, filter_bank, ir_blocks):
+        """
+        Create a Filter for every filter of a filter bank
+
+        :param filter_bank: filter bank [filter, ear, block, bin]
+        :param ir_blocks: number of blocks of these filters
+        :return: list of Filter objects in bank order
+        """
+        filters = []
+        for i in range(len(filter_bank)):
+            current_filter = Filter(None, ir_blocks, self.block_size)
+            current_filter.setFilterFD(filter_bank, i)
+            filters.append(current_filter)
+
+        return filters
 
     def get_filter(self, pose):
         """
-        Searches in the dict if key is available and return corresponding filter
-        When no filter is found, defaultFilter is returned which results in silence
+        Searches the filter with the nearest orientation and returns it
 
         :param pose
         :return: corresponding filter for pose
         """
 
+        if self.filter_tree is None:
+            return self.default_filter
+
         find_me = pose.orientation[0:2]
         d, i = self.filter_tree.query(find_me)
-        fvl = self.filter_arr[i] + [0, 0, 0, 0, 0, 0, 0]
-        newpose = Pose.from_filterValueList(fvl)
-
-        key = newpose.create_key()
 
-        if key in self.filter_dict:
-            self.log.info("Filter found: key: {}".format(key))
-            result_filter = self.filter_dict.get(key)
+        result_filter = self.filter_objs[i]
+        # called for every filter update of every channel, so messages are only formatted when they are logged
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug("Filter found: key: {}".format(self.filter_keys[i]))
             if result_filter.filename is not None:
-                self.log.info("   use file:: {}".format(result_filter.filename))
-            return result_filter
-        else:
-            self.log.warning('Filter not found: key: {}'.format(key))
-            return self.default_filter
+                self.log.debug("   use file:: {}".format(result_filter.filename))
+        return result_filter
 
     def get_late_reverb_filter(self, pose):
+        if self.late_reverb_tree is None:
+            return self.default_late_reverb_filter
+
         find_me = pose.orientation[0:2]
         d, i = self.late_reverb_tree.query(find_me)
-        fvl = list(map(int, self.late_reverb_arr[i] + [0, 0, 0, 0, 0, 0, 0]))
-        newpose = Pose.from_filterValueList(fvl)
 
-        key = newpose.create_key()
-        
-        if key in self.late_reverb_filter_dict:
-            self.log.info(f'Late Reverb Filter found: key: {key}')
-            return self.late_reverb_filter_dict.get(key)
-        else:
-            self.log.warning(f'Late Reverb Filter not found: key: {key}')
-            return self.default_late_reverb_filter
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug(f'Late Reverb Filter found: key: {self.late_reverb_keys[i]}')
+        return self.late_reverb_objs[i]
 
     def get_directivity_filter(self, pose):
+        if self.directivity_tree is None:
+            return self.default_directivity_filter
+
         find_me = pose.orientation[0:2]
         d, i = self.directivity_tree.query(find_me)
-        fvl = self.directivity_arr[i] + [0, 0, 0, 0, 0, 0, 0]
-        newpose = Pose.from_filterValueList(fvl)
 
-        key = newpose.create_key()
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug(f'Directivity Filter found: key: {self.directivity_keys[i]}')
+        return self.directivity_objs[i]
 
-        if key in self.directivity_dict:
-            self.log.info(f'Directivity Filter found: key: {key}')
-            return self.directivity_dict.get(key)
-        else:
-            self.log.warning(f'Directivity Filter not found: key: {key}')
-            return self.default_directivity_filter
+    def get_filters_batch(self, orientations):
+        """
+        Searches the filters with the nearest orientations for several poses at once,
+        e.g. for all channels, with a single KDTree query
+
+        :param orientations: array of yaw and pitch values [n_poses, 2]
+        :return: list of the corresponding filters
+        """
+        orientations = np.asarray(orientations, dtype=np.float64).reshape(-1, 2)
+        if self.filter_tree is None:
+            return [self.default_filter] * len(orientations)
+
+        d, indices = self.filter_tree.query(orientations, workers=-1)
+
+        return [self.filter_objs[i] for i in indices]
 
     def close(self):
         self.log.info('FilterStorage: close()')
@@ -402,37 +601,93 @@ class FilterStorage(object):
 
         return self.headphone_filter
 
+    def read_filters(self, filter_entries):
+        """
+        Load the filters of a chunk of the parsed filter list
+
+        :param filter_entries: list of (Pose, filter-path, FilterType) tuples
+        :return: list of time domain filters
+        """
+        return [self.read_filter(filter_path, filter_type) for _, filter_path, filter_type in filter_entries]
+
+    def read_filter(self, filter_path, filter_type):
+        """
+        Load a filter from file and apply the headphone filter to filters and late reverb filters.
+        Called from the worker threads of load_filters, so it must not modify the FilterStorage
+
+        :param filter_path: path of the wav file
+        :param filter_type: FilterType of the filter
+        :return: time domain filter of shape (filter length, 2)
+        """
+        self.log.debug(f'Loading {filter_path}')
+        current_filter = self.load_filter(filter_path, filter_type)
+
+        if filter_type == FilterType.Filter or filter_type == FilterType.LateReverbFilter:
+            current_filter = self.apply_headphone_filter(current_filter)
+
+        return current_filter
+
+    def apply_headphone_filter(self, current_filter):
+        """
+        Convolve a time domain filter with the headphone filter, if it is merged into the filters, so the
+        headphone equalization does not need a convolver of its own while processing.
+        The whole convolution is kept: cutting it to the filter length would remove everything
+        the headphone filter delays beyond the end of the filter, e.g. the direct sound
+
+        :param current_filter: filter of shape (filter length, 2)
+        :return: filter of shape (filter length + headphone_extension, 2)
+        """
+        if not self.mergeHeadphoneFilter:
+            return current_filter
+
+        filter_length = np.shape(current_filter)[0]
+        equalized_filter = np.zeros((filter_length + self.headphone_extension, 2), dtype=np.float32)
+        convolved_filter = fftconvolve(current_filter, self.headphone_ir, axes=0)
+        equalized_filter[:np.shape(convolved_filter)[0]] = convolved_filter
+
+        return equalized_filter
+
     def load_filter(self, filter_path, filter_type):
-        # Directivity filters are mono only
-        if filter_type != FilterType.Directivity:
-            current_filter, fs = sf.read(filter_path, dtype='float32')
-        else:
-            current_filter, fs = sf.read(filter_path, dtype='float32', always_2d=True)
-            # for some reason always_2d does nothing...
-            current_filter = np.column_stack((current_filter, current_filter))
+        current_filter, fs = sf.read(filter_path, dtype='float32', always_2d=True)
 
-        filter_size = np.shape(current_filter)
+        if filter_type == FilterType.Directivity:
+            # Directivity filters are mono only and keep a single channel, which is used for both ears
+            current_filter = current_filter[:, :1]
+        elif np.shape(current_filter)[1] == 1:
+            # mono files are used for both ears; the filter is only read afterwards, so no copy is needed
+            current_filter = np.broadcast_to(current_filter, (np.shape(current_filter)[0], 2))
 
         if filter_type == FilterType.Filter:
-            # Fill filter with zeros if to short
-            if filter_size[0] < self.ir_size:
-                self.log.warning('Filter too short: Fill up with zeros')
-                current_filter = np.concatenate((current_filter, np.zeros(
-                    (self.ir_size - filter_size[0], 2), np.float32)), 0)
-            if filter_size[0] > self.ir_size:
-                self.log.warning('Filter too long: shorten')
-                current_filter = current_filter[:self.ir_size]
+            current_filter = self.fit_filter_size(current_filter, self.ir_size, 'Filter')
         elif filter_type == FilterType.LateReverbFilter:
-            if filter_size[0] > self.lateReverbSize:
-                self.log.warning('Reverb Filter too long: shorten')
-                current_filter = current_filter[:self.lateReverbSize]
+            current_filter = self.fit_filter_size(current_filter, self.lateReverbSize, 'Reverb filter')
+        elif filter_type == FilterType.HeadphoneFilter:
+            current_filter = self.fit_filter_size(current_filter, self.headPhoneFilterSize, 'Headphone filter')
         elif filter_type == FilterType.Directivity:
-            if filter_size[0] > self.directivitySize:
-                self.log.warning('Directivity filter too long: shorten')
-                current_filter = current_filter[:self.directivitySize]
-            elif filter_size[0] < self.directivitySize:
-                self.log.warning('Directivity filter too short: Fill up with zeroes')
-                current_filter = np.concatenate((current_filter, np.zeros(
-                    (self.directivitySize - filter_size[0], 2), np.float32)), 0)
+            current_filter = self.fit_filter_size(current_filter, self.directivitySize, 'Directivity filter')
+
+        return current_filter
+
+    def fit_filter_size(self, current_filter, target_size, filter_description):
+        """
+        Shorten a filter or fill it up with zeros, so it has the target size
+
+        :param current_filter: filter of shape (filter length, channels)
+        :param target_size: number of samples the filter should have
+        :param filter_description: name of the filter type used in the log
+        :return: filter of shape (target_size, channels)
+        """
+        filter_size, channels = np.shape(current_filter)
+
+        if filter_size > target_size:
+            self.log.warning('{} too long: shorten'.format(filter_description))
+            return current_filter[:target_size]
+
+        if filter_size < target_size:
+            self.log.warning('{} too short: Fill up with zeros'.format(filter_description))
+            # copy into the final array instead of concatenating a separate block of zeros
+            padded_filter = np.zeros((target_size, channels), dtype=np.float32)
+            padded_filter[:filter_size] = current_filter
+            return padded_filter
 
         return current_filter
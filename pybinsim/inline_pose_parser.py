@@ -18,13 +18,12 @@ class InlinePoseParser(object):
 	def parse_pose_input(self, channel, azi_lst, ele_lst, azi_src, ele_src):
 		""" Compare new pose data with existing pose, determine if an update is needed """
 		
-		# we are just using first 2 elements of valueList for now
-		poseData = (azi_lst, ele_lst, 0, azi_src, ele_src, 0, 0, 0, 0)
-
-		# compare poseData with valueList for channel
-		if poseData != self.valueList[channel][:len(poseData)]:
+		# compare the changing values directly, the pose tuple is only built when the pose has changed
+		currentValues = self.valueList[channel]
+		if (azi_lst != currentValues[0] or ele_lst != currentValues[1] or
+				azi_src != currentValues[3] or ele_src != currentValues[4]):
 			self.filtersUpdated[channel] = True
-			self.valueList[channel] = poseData + self.defaultValue[len(poseData):]            
+			self.valueList[channel] = (azi_lst, ele_lst, 0, azi_src, ele_src, 0, 0, 0, 0)
 
 			# self.log.info("Channel: {}".format(str(channel)))
 			# self.log.info("Args: {}".format(str(poseData)))
@@ -3,6 +3,7 @@
 
 """Helper functions for working with audio files in NumPy."""
 import contextlib
+import functools
 
 from sys import getsizeof, stderr
 from itertools import chain
@@ -116,6 +117,27 @@ def pcm24to32(data, channels=1, normalize=True):
     return out
 
 
+@functools.lru_cache(maxsize=16)
+def crossfade_windows(block_size):
+    """Return the cosine-square crossfade windows for a block size.
+    The windows are cached and shared between all users, so they are
+    returned read-only.
+    Parameters
+    ----------
+    block_size : int
+        Length of the windows in samples.
+    Returns
+    -------
+    tuple of numpy.ndarray
+        The fade-out and fade-in windows as contiguous *float32* arrays.
+    """
+    fade_out = np.square(np.cos(np.arange(block_size, dtype='float32') / (block_size - 1) * (np.pi / 2)))
+    fade_in = np.ascontiguousarray(np.flip(fade_out))
+    fade_out.flags.writeable = False
+    fade_in.flags.writeable = False
+    return fade_out, fade_in
+
+
 @contextlib.contextmanager
 def printoptions(*args, **kwargs):
     """Context manager for temporarily setting NumPy print options.
@@ -0,0 +1,153 @@
+from unittest import TestCase
+
+import numpy as np
+
+from pybinsim.convolver import ConvolverFFTW
+
+
+class StaticFilter(object):
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+
+    def getFilterFD(self):
+        return self.left, self.right
+
+
+def blocked_spectrum(ir, block_size):
+    blocks = np.reshape(ir, (-1, block_size))
+    return np.fft.rfft(blocks, n=block_size * 2, axis=1).astype('complex64')
+
+
+class TestConvolverFFTW(TestCase):
+    def convolve(self, signal, ir_left, ir_right, block_size):
+        ir_blocks = ir_left.size // block_size
+        n_blocks = signal.size // block_size
+
+        filter = StaticFilter(blocked_spectrum(ir_left, block_size), blocked_spectrum(ir_right, block_size))
+        ones = np.ones((ir_blocks, block_size + 1), dtype='complex64')
+        dir_filter = StaticFilter(ones, ones)
+
+        convolver = ConvolverFFTW(block_size * ir_blocks, block_size, False)
+        convolver.setIR(filter, False, 1, dir_filter)
+
+        left = []
+        right = []
+        for block in np.reshape(signal, (n_blocks, block_size)):
+            out_left, out_right = convolver.process(block)
+            left.append(np.copy(out_left))
+            right.append(np.copy(out_right))
+
+        return np.concatenate(left), np.concatenate(right)
+
+    def test_process_matches_linear_convolution(self):
+        block_size = 32
+        rng = np.random.default_rng(0)
+        ir_left = rng.standard_normal(block_size * 4).astype('float32')
+        ir_right = rng.standard_normal(block_size * 4).astype('float32')
+        signal = rng.standard_normal(block_size * 12).astype('float32')
+
+        left, right = self.convolve(signal, ir_left, ir_right, block_size)
+
+        np.testing.assert_allclose(left, np.convolve(signal, ir_left)[:signal.size], atol=1e-4)
+        np.testing.assert_allclose(right, np.convolve(signal, ir_right)[:signal.size], atol=1e-4)
+
+    def test_process_after_silence(self):
+        block_size = 32
+        rng = np.random.default_rng(1)
+        ir_left = rng.standard_normal(block_size * 4).astype('float32')
+        ir_right = rng.standard_normal(block_size * 4).astype('float32')
+        signal = rng.standard_normal(block_size * 20).astype('float32')
+        # long enough to clear the delay lines, so the convolver skips processing
+        signal[block_size * 4:block_size * 12] = 0
+
+        left, right = self.convolve(signal, ir_left, ir_right, block_size)
+
+        np.testing.assert_allclose(left, np.convolve(signal, ir_left)[:signal.size], atol=1e-4)
+        np.testing.assert_allclose(right, np.convolve(signal, ir_right)[:signal.size], atol=1e-4)
+
+    def test_process_writes_interleaved_output(self):
+        block_size = 32
+        rng = np.random.default_rng(2)
+        ir = rng.standard_normal(block_size * 2).astype('float32')
+        ones = np.ones((2, block_size + 1), dtype='complex64')
+
+        convolver = ConvolverFFTW(block_size * 2, block_size, False)
+        convolver.setIR(StaticFilter(blocked_spectrum(ir, block_size), blocked_spectrum(-ir, block_size)), False, 1,
+                        StaticFilter(ones, ones))
+
+        out = np.empty((block_size, 2), dtype='float32')
+        for block in rng.standard_normal((3, block_size)).astype('float32'):
+            left, right = convolver.process(block, out=out)
+            np.testing.assert_array_equal(out[:, 0], left)
+            np.testing.assert_array_equal(out[:, 1], right)
+
+    def test_extended_early_filters_overlap_late_reverb(self):
+        block_size = 32
+        extension = block_size * 2
+        rng = np.random.default_rng(3)
+        # early and late filters extended by a merged headphone filter
+        early = rng.standard_normal((2, block_size * 2 + extension)).astype('float32')
+        late = rng.standard_normal((2, block_size * 2 + extension)).astype('float32')
+        signal = rng.standard_normal(block_size * 12).astype('float32')
+        ones = np.ones((1, block_size + 1), dtype='complex64')
+
+        convolver = ConvolverFFTW(block_size * 2, block_size, False, True, block_size * 2, filterExtension=extension)
+        convolver.setIR(StaticFilter(blocked_spectrum(early[0], block_size), blocked_spectrum(early[1], block_size)),
+                        False, 1, StaticFilter(ones, ones))
+        convolver.setLateReverb(StaticFilter(blocked_spectrum(late[0], block_size),
+                                             blocked_spectrum(late[1], block_size)), False)
+
+        output = [np.concatenate(convolver.process(block)) for block in np.reshape(signal, (-1, block_size))]
+        output = np.reshape(output, (-1, 2, block_size)).transpose(1, 0, 2).reshape(2, -1)
+
+        # the late part starts at the nominal end of the early part
+        ir = np.zeros((2, block_size * 4 + extension), dtype='float32')
+        ir[:, :early.shape[1]] += early
+        ir[:, block_size * 2:] += late
+        for ear in range(2):
+            np.testing.assert_allclose(output[ear], np.convolve(signal, ir[ear])[:signal.size], atol=1e-4)
+
+    def test_filter_cache_quantizes_distance(self):
+        block_size = 32
+        rng = np.random.default_rng(4)
+        ir = rng.standard_normal(block_size * 2).astype('float32')
+        ones = np.ones((2, block_size + 1), dtype='complex64')
+        filter = StaticFilter(blocked_spectrum(ir, block_size), blocked_spectrum(ir, block_size))
+        dir_filter = StaticFilter(ones, ones)
+
+        convolver = ConvolverFFTW(block_size * 2, block_size, False)
+        for dist in np.float32([0.80001, 0.80002, 0.79999]):
+            convolver.setIR(filter, False, dist, dir_filter)
+
+        self.assertEqual(len(convolver.filterCache), 1)
+        np.testing.assert_allclose(convolver.TF_left_blocked, filter.left * (0.8 * convolver.ifftScaling), rtol=1e-6)
+
+        # near sources are rounded relative to their distance
+        for dist in np.float32([0.0123456, 0.0123461]):
+            convolver.setIR(filter, False, dist, dir_filter)
+
+        self.assertEqual(len(convolver.filterCache), 2)
+        np.testing.assert_allclose(convolver.TF_left_blocked, filter.left * (0.01235 * convolver.ifftScaling),
+                                   rtol=1e-6)
+
+    def test_stereo_process_without_directivity(self):
+        block_size = 32
+        rng = np.random.default_rng(5)
+        ir = rng.standard_normal((2, block_size * 2)).astype('float32')
+        signal = rng.standard_normal((block_size * 8, 2)).astype('float32')
+
+        # e.g. headphone equalization of the output of another convolver
+        convolver = ConvolverFFTW(block_size * 2, block_size, True)
+        convolver.setIR(StaticFilter(blocked_spectrum(ir[0], block_size), blocked_spectrum(ir[1], block_size)), False)
+
+        output = []
+        for block in np.reshape(signal, (-1, block_size, 2)):
+            # processed in-place, as for the output of the channel convolvers
+            block = np.copy(block)
+            convolver.process(block, out=block)
+            output.append(block)
+        output = np.concatenate(output)
+
+        for ear in range(2):
+            np.testing.assert_allclose(output[:, ear], np.convolve(signal[:, ear], ir[ear])[:len(signal)], atol=1e-4)
@@ -0,0 +1,257 @@
+import os
+import tempfile
+from unittest import TestCase, mock
+
+import numpy as np
+import soundfile as sf
+
+from pybinsim.filterstorage import FilterStorage
+from pybinsim.pose import Pose
+
+
+def blocked_spectrum(ir, block_size):
+    blocks = np.reshape(ir, (-1, block_size))
+    return np.fft.rfft(blocks, n=block_size * 2, axis=1)
+
+
+class TestFilterStorage(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write_wav(self, name, data):
+        path = os.path.join(self.directory.name, name)
+        sf.write(path, data, 48000, subtype='FLOAT')
+        return path
+
+    def write_filter_list(self, lines):
+        path = os.path.join(self.directory.name, 'filter_list.txt')
+        with open(path, 'w') as filter_list:
+            filter_list.write('\n'.join(lines) + '\n')
+        return path
+
+    def create_storage(self, block_size, **kwargs):
+        rng = np.random.default_rng(0)
+        self.ir = rng.standard_normal((block_size * 4, 2)).astype('float32')
+        self.late_reverb = rng.standard_normal((block_size * 2, 2)).astype('float32')
+        self.directivity = rng.standard_normal((block_size, 1)).astype('float32')
+
+        filter_list = self.write_filter_list([
+            'FILTER 0.0 90.0 0 0 0 0 0 0 0 ' + self.write_wav('filter.wav', self.ir),
+            'LATEREVERB 0 0 0 0 0 0 0 0 0 ' + self.write_wav('late_reverb.wav', self.late_reverb),
+            'DIRECTIVITY 0.0 90.0 0 0 0 0 0 0 0 ' + self.write_wav('directivity.wav', self.directivity)])
+
+        storage = FilterStorage(block_size * 4, block_size, filter_list, useSplittedFilters=True,
+                                lateReverbSize=block_size * 2, directivitySize=block_size, **kwargs)
+        return storage
+
+    def test_filters_with_different_sizes(self):
+        block_size = 32
+        storage = self.create_storage(block_size)
+
+        left, right = storage.get_filter(Pose.from_filterValueList([0.0, 90.0, 0, 0, 0, 0])).getFilterFD()
+        np.testing.assert_allclose(left, blocked_spectrum(self.ir[:, 0], block_size), atol=1e-4)
+        np.testing.assert_allclose(right, blocked_spectrum(self.ir[:, 1], block_size), atol=1e-4)
+
+        left, right = storage.get_late_reverb_filter(Pose.from_filterValueList([0, 0, 0, 0, 0, 0])).getFilterFD()
+        np.testing.assert_allclose(left, blocked_spectrum(self.late_reverb[:, 0], block_size), atol=1e-4)
+        np.testing.assert_allclose(right, blocked_spectrum(self.late_reverb[:, 1], block_size), atol=1e-4)
+
+        # directivity filters are mono, both ears use the same spectrum
+        self.assertEqual(storage.directivity_bank.shape[1], 1)
+        left, right = storage.get_directivity_filter(Pose.from_filterValueList([0.0, 90.0, 0, 0, 0, 0])).getFilterFD()
+        np.testing.assert_allclose(left, blocked_spectrum(self.directivity[:, 0], block_size), atol=1e-4)
+        np.testing.assert_array_equal(right, left)
+
+        # the spectra are views of the banks, which are shared and read-only
+        self.assertFalse(storage.filter_bank.flags.writeable)
+        self.assertFalse(left.flags.writeable)
+        self.assertFalse(storage.default_filter.getFilterFD()[0].flags.writeable)
+
+    def test_half_precision_filters(self):
+        block_size = 32
+        storage = self.create_storage(block_size, useHalfPrecisionFilters=True)
+
+        self.assertEqual(storage.filter_bank.dtype, np.float16)
+        self.assertFalse(storage.filter_bank.flags.writeable)
+
+        result_filter = storage.get_filter(Pose.from_filterValueList([0.0, 90.0, 0, 0, 0, 0]))
+        left, right = result_filter.getFilterFD()
+        self.assertEqual(left.dtype, np.complex64)
+        np.testing.assert_array_equal(result_filter.TF_left_blocked, left)
+        np.testing.assert_array_equal(result_filter.TF_right_blocked, right)
+        np.testing.assert_allclose(left, blocked_spectrum(self.ir[:, 0], block_size), rtol=1e-2, atol=1e-2)
+        np.testing.assert_allclose(right, blocked_spectrum(self.ir[:, 1], block_size), rtol=1e-2, atol=1e-2)
+
+        # the converted mono spectrum is shared by both ears
+        left, right = storage.get_directivity_filter(Pose.from_filterValueList([0.0, 90.0, 0, 0, 0, 0])).getFilterFD()
+        self.assertIs(right, left)
+        self.assertFalse(left.flags.writeable)
+
+    def test_nearest_filter_lookup(self):
+        block_size = 32
+        rng = np.random.default_rng(1)
+        front = rng.standard_normal((block_size, 2)).astype('float32')
+        side = rng.standard_normal((block_size, 2)).astype('float32')
+        directivity = np.ones((block_size, 1), dtype='float32')
+
+        # integer formatted orientations used to miss the dict lookup
+        filter_list = self.write_filter_list([
+            'FILTER 0 90 0 0 0 0 0 0 0 ' + self.write_wav('front.wav', front),
+            'FILTER 90 90 0 0 0 0 0 0 0 ' + self.write_wav('side.wav', side),
+            'LATEREVERB 0 0 0 0 0 0 0 0 0 ' + self.write_wav('late_reverb.wav', side),
+            'DIRECTIVITY 0 0 0 0 0 0 0 0 0 ' + self.write_wav('directivity.wav', directivity)])
+
+        storage = FilterStorage(block_size, block_size, filter_list, useSplittedFilters=True,
+                                lateReverbSize=block_size, directivitySize=block_size)
+
+        left, right = storage.get_filter(Pose.from_filterValueList([80.0, 85.0, 0, 0, 0, 0])).getFilterFD()
+        np.testing.assert_allclose(left, blocked_spectrum(side[:, 0], block_size), atol=1e-4)
+        np.testing.assert_allclose(right, blocked_spectrum(side[:, 1], block_size), atol=1e-4)
+
+    def test_filters_are_loaded_in_chunks(self):
+        block_size = 32
+        rng = np.random.default_rng(7)
+        irs = rng.standard_normal((5, block_size * 2, 2)).astype('float32')
+        directivity = np.ones((block_size, 1), dtype='float32')
+
+        filter_list = self.write_filter_list(
+            ['FILTER {} 90 0 0 0 0 0 0 0 {}'.format(i * 10, self.write_wav('filter{}.wav'.format(i), ir))
+             for i, ir in enumerate(irs)] +
+            ['DIRECTIVITY 0 0 0 0 0 0 0 0 0 ' + self.write_wav('directivity.wav', directivity)])
+
+        # two full chunks and a shorter last one, which must not pick up stale data of the previous chunk
+        with mock.patch.object(FilterStorage, 'load_chunk_size', 2):
+            storage = FilterStorage(block_size * 2, block_size, filter_list, directivitySize=block_size)
+
+        self.assertEqual(len(storage.filter_bank), len(irs))
+        for i, ir in enumerate(irs):
+            left, right = storage.get_filter(Pose.from_filterValueList([i * 10, 90, 0, 0, 0, 0])).getFilterFD()
+            np.testing.assert_allclose(left, blocked_spectrum(ir[:, 0], block_size), atol=1e-4)
+            np.testing.assert_allclose(right, blocked_spectrum(ir[:, 1], block_size), atol=1e-4)
+
+    def test_short_filters_are_zero_padded(self):
+        block_size = 32
+        rng = np.random.default_rng(2)
+        ir = rng.standard_normal((block_size * 2, 2)).astype('float32')
+        late_reverb = rng.standard_normal((block_size, 2)).astype('float32')
+        directivity = np.ones((block_size, 1), dtype='float32')
+
+        filter_list = self.write_filter_list([
+            'FILTER 0 90 0 0 0 0 0 0 0 ' + self.write_wav('filter.wav', ir),
+            'LATEREVERB 0 0 0 0 0 0 0 0 0 ' + self.write_wav('late_reverb.wav', late_reverb),
+            'DIRECTIVITY 0 0 0 0 0 0 0 0 0 ' + self.write_wav('directivity.wav', directivity)])
+
+        storage = FilterStorage(block_size * 4, block_size, filter_list, useSplittedFilters=True,
+                                lateReverbSize=block_size * 2, directivitySize=block_size * 4)
+
+        padded_ir = np.concatenate((ir, np.zeros((block_size * 2, 2), dtype='float32')))
+        left, right = storage.get_filter(Pose.from_filterValueList([0, 90, 0, 0, 0, 0])).getFilterFD()
+        np.testing.assert_allclose(left, blocked_spectrum(padded_ir[:, 0], block_size), atol=1e-4)
+        np.testing.assert_allclose(right, blocked_spectrum(padded_ir[:, 1], block_size), atol=1e-4)
+
+        padded_late_reverb = np.concatenate((late_reverb, np.zeros((block_size, 2), dtype='float32')))
+        left, right = storage.get_late_reverb_filter(Pose.from_filterValueList([0, 0, 0, 0, 0, 0])).getFilterFD()
+        np.testing.assert_allclose(left, blocked_spectrum(padded_late_reverb[:, 0], block_size), atol=1e-4)
+
+    def test_mono_filters_are_used_for_both_ears(self):
+        block_size = 32
+        rng = np.random.default_rng(3)
+        ir = rng.standard_normal(block_size * 2).astype('float32')
+        directivity = np.ones(block_size, dtype='float32')
+
+        filter_list = self.write_filter_list([
+            'FILTER 0 90 0 0 0 0 0 0 0 ' + self.write_wav('filter.wav', ir),
+            'LATEREVERB 0 0 0 0 0 0 0 0 0 ' + self.write_wav('late_reverb.wav', ir),
+            'DIRECTIVITY 0 0 0 0 0 0 0 0 0 ' + self.write_wav('directivity.wav', directivity)])
+
+        storage = FilterStorage(block_size * 2, block_size, filter_list, useSplittedFilters=True,
+                                lateReverbSize=block_size * 2, directivitySize=block_size)
+
+        left, right = storage.get_filter(Pose.from_filterValueList([0, 90, 0, 0, 0, 0])).getFilterFD()
+        np.testing.assert_allclose(left, blocked_spectrum(ir, block_size), atol=1e-4)
+        np.testing.assert_allclose(right, blocked_spectrum(ir, block_size), atol=1e-4)
+
+    def test_batch_lookup_and_missing_filter_types(self):
+        block_size = 32
+        rng = np.random.default_rng(4)
+        front = rng.standard_normal((block_size, 2)).astype('float32')
+        side = rng.standard_normal((block_size, 2)).astype('float32')
+
+        # no late reverb and directivity filters in the list
+        filter_list = self.write_filter_list([
+            'FILTER 0 90 0 0 0 0 0 0 0 ' + self.write_wav('front.wav', front),
+            'FILTER 90 90 0 0 0 0 0 0 0 ' + self.write_wav('side.wav', side)])
+
+        storage = FilterStorage(block_size, block_size, filter_list, useSplittedFilters=True,
+                                lateReverbSize=block_size, directivitySize=block_size)
+
+        filters = storage.get_filters_batch([[80.0, 85.0], [10.0, 90.0], [90.0, 90.0]])
+        self.assertEqual(filters, [storage.get_filter(Pose.from_filterValueList([90, 90, 0, 0, 0, 0])),
+                                   storage.get_filter(Pose.from_filterValueList([0, 90, 0, 0, 0, 0])),
+                                   storage.get_filter(Pose.from_filterValueList([90, 90, 0, 0, 0, 0]))])
+
+        pose = Pose.from_filterValueList([0, 0, 0, 0, 0, 0])
+        self.assertIs(storage.get_late_reverb_filter(pose), storage.default_late_reverb_filter)
+        self.assertIs(storage.get_directivity_filter(pose), storage.default_directivity_filter)
+
+    def test_delayed_headphone_filter_is_not_truncated(self):
+        block_size = 32
+        rng = np.random.default_rng(5)
+        ir = rng.standard_normal((block_size * 2, 2)).astype('float32')
+        late_reverb = rng.standard_normal((block_size, 2)).astype('float32')
+        directivity = np.ones((block_size, 1), dtype='float32')
+        # unit impulse delayed by more than half of the filter size
+        headphone_filter = np.zeros((block_size * 2, 2), dtype='float32')
+        headphone_filter[48] = 1
+
+        filter_list = self.write_filter_list([
+            'HPFILTER ' + self.write_wav('headphone.wav', headphone_filter),
+            'FILTER 0 90 0 0 0 0 0 0 0 ' + self.write_wav('filter.wav', ir),
+            'LATEREVERB 0 0 0 0 0 0 0 0 0 ' + self.write_wav('late_reverb.wav', late_reverb),
+            'DIRECTIVITY 0 0 0 0 0 0 0 0 0 ' + self.write_wav('directivity.wav', directivity)])
+
+        storage = FilterStorage(block_size * 2, block_size, filter_list, useHeadphoneFilter=True,
+                                headphoneFilterSize=block_size * 2, useSplittedFilters=True,
+                                lateReverbSize=block_size, directivitySize=block_size)
+
+        self.assertEqual(storage.headphone_extension, block_size * 2)
+
+        delayed_ir = np.zeros((block_size * 4, 2), dtype='float32')
+        delayed_ir[48:48 + block_size * 2] = ir
+        left, right = storage.get_filter(Pose.from_filterValueList([0, 90, 0, 0, 0, 0])).getFilterFD()
+        np.testing.assert_allclose(left, blocked_spectrum(delayed_ir[:, 0], block_size), atol=1e-4)
+        np.testing.assert_allclose(right, blocked_spectrum(delayed_ir[:, 1], block_size), atol=1e-4)
+
+        delayed_late_reverb = np.zeros((block_size * 3, 2), dtype='float32')
+        delayed_late_reverb[48:48 + block_size] = late_reverb
+        left, right = storage.get_late_reverb_filter(Pose.from_filterValueList([0, 0, 0, 0, 0, 0])).getFilterFD()
+        np.testing.assert_allclose(left, blocked_spectrum(delayed_late_reverb[:, 0], block_size), atol=1e-4)
+
+    def test_headphone_filter_is_not_merged_with_longer_directivity(self):
+        block_size = 32
+        rng = np.random.default_rng(6)
+        ir = rng.standard_normal((block_size * 2, 2)).astype('float32')
+        directivity = rng.standard_normal((block_size * 2, 1)).astype('float32')
+        headphone_filter = np.zeros((block_size * 2, 2), dtype='float32')
+        headphone_filter[48] = 1
+
+        filter_list = self.write_filter_list([
+            'HPFILTER ' + self.write_wav('headphone.wav', headphone_filter),
+            'FILTER 0 90 0 0 0 0 0 0 0 ' + self.write_wav('filter.wav', ir),
+            'DIRECTIVITY 0 0 0 0 0 0 0 0 0 ' + self.write_wav('directivity.wav', directivity)])
+
+        # directivity filters with two blocks are applied per block after the filters, so the headphone
+        # filter has to be applied to the output instead
+        storage = FilterStorage(block_size * 2, block_size, filter_list, useHeadphoneFilter=True,
+                                headphoneFilterSize=block_size * 2, directivitySize=block_size * 2)
+
+        self.assertFalse(storage.mergeHeadphoneFilter)
+        self.assertEqual(storage.headphone_extension, 0)
+
+        left, right = storage.get_filter(Pose.from_filterValueList([0, 90, 0, 0, 0, 0])).getFilterFD()
+        np.testing.assert_allclose(left, blocked_spectrum(ir[:, 0], block_size), atol=1e-4)
+        np.testing.assert_allclose(right, blocked_spectrum(ir[:, 1], block_size), atol=1e-4)
+
+        left, right = storage.get_headphone_filter().getFilterFD()
+        np.testing.assert_allclose(left, blocked_spectrum(headphone_filter[:, 0], block_size), atol=1e-4)